@@ -0,0 +1,292 @@
+import threading
+import time
+from collections import deque
+
+from Timing import Timings
+
+
+class Actuator:
+    # Mouse output on its own thread: the vision loop only queues commands.
+    # Consecutive moves are merged so the cursor jumps to the newest position.
+    # Buttons are queued by name ("left"/"right") and mapped with buttons.
+    # A backend with flush() (see MouseBackends) is flushed whenever the queue runs empty
+    # Continuous scrolling runs here too: the vision loop sets a velocity and the thread
+    # emits scroll events scroll_rate times a second.
+    # With a cursor_rate moves are glided: each new position becomes a target the thread
+    # reaches in cursor_rate steps per second, spread over the time between vision updates
+    def __init__(self, mouse, buttons=None, timings=None, history=1000, scroll_rate=60, smooth_scroll=False,
+                 cursor_rate=0):
+        self.mouse = mouse
+        self._flush = getattr(mouse, "flush", None) # Batching backends send on flush
+        self.buttons = buttons or {}
+        self.timings = timings if timings is not None else Timings()
+
+        self.scroll_period = 1.0 / scroll_rate
+        self.smooth_scroll = smooth_scroll # Backend takes fractional scroll amounts
+        self.scroll_events = 0
+
+        self._scroll_velocity = (0.0, 0.0) # Lines per second
+        self._scroll_remainder = [0.0, 0.0] # Fractions not sent yet
+        self._last_scroll_tick = 0.0
+        self._next_scroll_tick = 0.0
+
+        self.cursor_period = 1.0 / cursor_rate if cursor_rate else 0.0 # 0 - move at once
+        self.cursor_events = 0
+
+        self._cursor_position = None # Last position set by a glide step
+        self._cursor_from = None # Where the glide to the current target started
+        self._cursor_target = None # (x, y, captured), None - no glide in flight
+        self._target_time = 0.0 # Arrival of the current target
+        self._target_interval = 1.0 / 30 # Smoothed time between targets, the glide duration
+        self._next_cursor_tick = 0.0
+
+        self.executed = 0
+        self.coalesced = 0
+        self.wait_times = deque(maxlen=history) # Seconds each command spent in the queue
+        self.latencies = deque(maxlen=history) # Seconds from frame capture to the cursor set
+        self.latency = None # Smoothed capture-to-cursor latency, None until measured
+
+        self._queue = deque() # (command, args, enqueue time)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="actuator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    # captured: capture time (time.monotonic) of the frame the position comes from
+    def move(self, x, y, captured=None):
+        if not self.cursor_period:
+            self._put("move", (x, y, captured))
+            return
+
+        with self._cond:
+            now = time.perf_counter()
+            if self._target_time:
+                interval = min(max(now - self._target_time, self.cursor_period), 0.2)
+                self._target_interval += (interval - self._target_interval) * 0.2
+            self._target_time = now
+
+            # Glide from where the cursor is now, the first target is a jump
+            self._cursor_from = self._cursor_position or (x, y)
+            if self._cursor_target is None:
+                self._next_cursor_tick = now
+            self._cursor_target = (x, y, captured)
+            self._cond.notify()
+
+    # Steps per second of the cursor glide, 0 moves the cursor once per vision update
+    def set_cursor_rate(self, rate):
+        with self._cond:
+            self.cursor_period = 1.0 / rate if rate else 0.0
+            if not rate:
+                self._cursor_target = None
+            self._cond.notify()
+
+    # Drop the glide in flight, the next move jumps (new session, hand lost)
+    def stop_cursor(self):
+        with self._cond:
+            self._cursor_target = None
+            self._cursor_position = None
+            self._target_time = 0.0
+
+    def click(self, button, count=1):
+        self._put("click", (button, count))
+
+    def press(self, button):
+        self._put("press", (button,))
+
+    def release(self, button):
+        self._put("release", (button,))
+
+    def scroll(self, dx, dy):
+        self._put("scroll", (dx, dy))
+
+    # Scroll speed in lines per second, (0, 0) stops
+    def set_scroll_velocity(self, dx, dy):
+        with self._cond:
+            now = time.perf_counter()
+            if dx == 0 and dy == 0:
+                self._scroll_remainder = [0.0, 0.0]
+            elif self._scroll_velocity == (0.0, 0.0):
+                self._last_scroll_tick = now
+                self._next_scroll_tick = now + self.scroll_period
+            self._scroll_velocity = (float(dx), float(dy))
+            self._cond.notify()
+
+    def _scroll_wait(self):
+        if self._scroll_velocity == (0.0, 0.0):
+            return None
+        return max(0.0, self._next_scroll_tick - time.perf_counter())
+
+    def _cursor_wait(self):
+        if self._cursor_target is None:
+            return None
+        return max(0.0, self._next_cursor_tick - time.perf_counter())
+
+    # Seconds to the next scroll or cursor tick, None - nothing to tick
+    def _tick_wait(self):
+        waits = [wait for wait in (self._scroll_wait(), self._cursor_wait()) if wait is not None]
+        return min(waits) if waits else None
+
+    def _put(self, command, args):
+        with self._cond:
+            if command == "move" and self._queue and self._queue[-1][0] == "move":
+                # Keep the wait time of the oldest pending move
+                self._queue[-1] = ("move", args, self._queue[-1][2])
+                self.coalesced += 1
+            else:
+                self._queue.append((command, args, time.perf_counter()))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue and self._tick_wait() != 0.0:
+                    self._cond.wait(self._tick_wait())
+                if not self._running and not self._queue: # Queued commands still run, e.g. a release
+                    break
+                if not self._queue:
+                    amount = self._scroll_amount() if self._scroll_wait() == 0.0 else (0, 0)
+                    step = self._cursor_step() if self._cursor_wait() == 0.0 else None
+                    command = None
+                else:
+                    command, args, enqueued = self._queue.popleft()
+
+            if command is None:
+                if amount != (0, 0):
+                    self._timed_scroll(amount)
+                if step is not None:
+                    self._timed_move(*step)
+                if amount != (0, 0) or step is not None:
+                    self._flush_output()
+                continue
+
+            self.wait_times.append(time.perf_counter() - enqueued)
+            try:
+                with self.timings.span("actuation"):
+                    self._execute(command, args)
+            except Exception as e:
+                print(f"Ошибка управления мышью ({command}): {e}")
+            else:
+                if not self._queue: # End of the batch, e.g. one frame's commands
+                    self._flush_output()
+                if command == "move" and args[2] is not None:
+                    self._add_latency(time.monotonic() - args[2])
+            self.executed += 1
+
+    def _flush_output(self):
+        if self._flush is None:
+            return
+        try:
+            with self.timings.span("flush"):
+                self._flush()
+        except Exception as e:
+            print(f"Ошибка управления мышью (flush): {e}")
+
+    def _add_latency(self, latency):
+        if not 0.0 < latency < 1.0: # Replayed timestamps aren't on this clock
+            return
+        self.latencies.append(latency)
+        self.latency = latency if self.latency is None else self.latency + (latency - self.latency) * 0.1
+
+    # Scroll due at this tick (called with the lock held): whole lines, or the exact
+    # fraction when the backend scrolls smoothly
+    def _scroll_amount(self):
+        now = time.perf_counter()
+        dt = now - self._last_scroll_tick
+        self._last_scroll_tick = now
+        self._next_scroll_tick = max(self._next_scroll_tick + self.scroll_period, now)
+
+        amount = []
+        for axis, velocity in enumerate(self._scroll_velocity):
+            self._scroll_remainder[axis] += velocity * dt
+            step = self._scroll_remainder[axis] if self.smooth_scroll else int(self._scroll_remainder[axis])
+            self._scroll_remainder[axis] -= step
+            amount.append(step)
+        return tuple(amount)
+
+    # Glide position at this tick (called with the lock held) and the capture time of the target
+    # once it's reached
+    def _cursor_step(self):
+        now = time.perf_counter()
+        self._next_cursor_tick = max(self._next_cursor_tick + self.cursor_period, now)
+
+        x, y, captured = self._cursor_target
+        progress = min(1.0, (now - self._target_time) / self._target_interval)
+        from_x, from_y = self._cursor_from
+        self._cursor_position = (from_x + (x - from_x) * progress, from_y + (y - from_y) * progress)
+
+        if progress < 1.0:
+            return self._cursor_position, None
+        self._cursor_target = None # Reached, idle until the next target
+        return self._cursor_position, captured
+
+    def _timed_move(self, position, captured):
+        try:
+            with self.timings.span("actuation"):
+                self.mouse.position = position
+            self.cursor_events += 1
+        except Exception as e:
+            print(f"Ошибка управления мышью (move): {e}")
+        else:
+            if captured is not None:
+                self._add_latency(time.monotonic() - captured)
+
+    def _timed_scroll(self, amount):
+        try:
+            with self.timings.span("actuation"):
+                self.mouse.scroll(*amount)
+            self.scroll_events += 1
+        except Exception as e:
+            print(f"Ошибка управления мышью (scroll): {e}")
+
+    def _execute(self, command, args):
+        if command == "move":
+            self.mouse.position = args[:2]
+        elif command == "click":
+            button, count = args
+            self.mouse.click(self.buttons.get(button, button), count)
+        elif command == "press":
+            self.mouse.press(self.buttons.get(args[0], args[0]))
+        elif command == "release":
+            self.mouse.release(self.buttons.get(args[0], args[0]))
+        elif command == "scroll":
+            self.mouse.scroll(*args)
+
+    def stats(self):
+        waits = sorted(self.wait_times)
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000 if waits else 0.0
+
+        latencies = sorted(self.latencies)
+        return {
+            "executed": self.executed,
+            "coalesced_moves": self.coalesced,
+            "scroll_events": self.scroll_events,
+            "cursor_events": self.cursor_events,
+            "queue_wait_p50_ms": percentile(0.50),
+            "queue_wait_p95_ms": percentile(0.95),
+            "queue_wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+            "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return (f"[actuator] {stats['executed']} commands, {stats['coalesced_moves']} moves merged, "
+                f"{stats['scroll_events']} scroll events, {stats['cursor_events']} cursor steps, "
+                f"queue wait p50 {stats['queue_wait_p50_ms']:.2f} ms / p95 {stats['queue_wait_p95_ms']:.2f} ms "
+                f"/ max {stats['queue_wait_max_ms']:.2f} ms, "
+                f"capture to cursor p50 {stats['latency_p50_ms']:.1f} ms")
@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+import HandTrakingModule as htm
+from HandMouse import HandControl
+from MouseBackends import RecordingBackend
+from SessionLog import SessionLog
+from Timing import Timings
+
+
+class StubLauncher:
+    def __init__(self):
+        self.launched = []
+
+    def __call__(self, command):
+        self.launched.append(command)
+        return True
+
+
+# Landmark trace: .npz with timestamps (N,), counts (N,), landmarks (N, hands, 21, 3),
+# labels (N, hands) and scores (N, hands), as written by --save-trace
+def save_landmark_trace(path, frames, max_hands=2):
+    n = len(frames)
+    landmarks = np.zeros((n, max_hands, 21, 3), np.float32)
+    labels = np.full((n, max_hands), "", dtype="<U5")
+    scores = np.zeros((n, max_hands), np.float32)
+    counts = np.zeros(n, np.int32)
+    timestamps = np.zeros(n, np.float64)
+
+    for i, (timestamp, (hand_landmarks, hand_labels, hand_scores)) in enumerate(frames):
+        k = min(len(hand_labels), max_hands)
+        timestamps[i] = timestamp
+        counts[i] = k
+        landmarks[i, :k] = hand_landmarks[:k]
+        labels[i, :k] = hand_labels[:k]
+        scores[i, :k] = hand_scores[:k]
+
+    np.savez_compressed(path, timestamps=timestamps, counts=counts, landmarks=landmarks,
+                        labels=labels, scores=scores)
+
+
+def load_landmark_trace(path):
+    data = np.load(path)
+    for i in range(len(data["timestamps"])):
+        k = int(data["counts"][i])
+        yield float(data["timestamps"][i]), (data["landmarks"][i, :k], data["labels"][i, :k].tolist(),
+                                             data["scores"][i, :k])
+
+
+def make_controller(args, timings, draw=True):
+    mouse = RecordingBackend((args.screen_width, args.screen_height), keep_events=False)
+    hand_control = HandControl(args.width, args.height, args.config,
+                               screen_size=(args.screen_width, args.screen_height), mouse=mouse,
+                               timings=timings, draw=draw)
+    hand_control._launch_application = StubLauncher()
+    return hand_control, mouse
+
+
+# Full pipeline on a video file: decode -> detect -> gestures, run serially so each stage is timed alone
+def replay_video(path, hand_control, times, fps=30.0, max_frames=None, trace=None):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Video {path} not found")
+
+    frames = 0
+    img = None
+    while max_frames is None or frames < max_frames:
+        start = time.perf_counter()
+        success, img = cap.read(img)
+        if not success:
+            break
+        if img.shape[1] != hand_control.w_cam or img.shape[0] != hand_control.h_cam:
+            img = cv2.resize(img, (hand_control.w_cam, hand_control.h_cam))
+        times.add("capture", time.perf_counter() - start)
+
+        timestamp = frames / fps
+        hands_data = _timed(times, "detect", hand_control._detect, img)
+        _timed(times, "gesture", hand_control._handle_hands, img, hands_data, timestamp)
+        if hand_control.draw:
+            _timed(times, "display", _render_preview, img, hand_control)
+
+        if trace is not None:
+            trace.append((timestamp, hands_data))
+        frames += 1
+
+    cap.release()
+    return frames
+
+
+# Window work of the instrumented mode without a window: HUD, timings table, preview scaling
+def _render_preview(img, hand_control):
+    cv2.putText(img, "Left: Apps | Right: Mouse", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    hand_control.timings.draw(img)
+    preview = cv2.resize(img, (int(500 * img.shape[1] / img.shape[0]), 500))
+    cv2.cvtColor(preview, cv2.COLOR_BGR2RGB, dst=preview)
+
+
+# Gesture stage only, from recorded landmarks (no Mediapipe)
+def replay_landmarks(source, hand_control, times, max_frames=None):
+    img = np.zeros((hand_control.h_cam, hand_control.w_cam, 3), np.uint8)
+
+    frames = 0
+    for timestamp, hands_data in source:
+        if max_frames is not None and frames >= max_frames:
+            break
+        _timed(times, "gesture", hand_control._handle_hands, img, hands_data, timestamp)
+        frames += 1
+    return frames
+
+
+def _timed(times, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    times.add(stage, time.perf_counter() - start)
+    return result
+
+
+# Keyframe mode against inference on every frame, on the same frames. The every-frame landmarks
+# are the reference for the landmark error, hands are matched by label
+def compare_keyframes(path, config_file, keyframe_interval, w_cam, h_cam, max_frames=None):
+    with open(config_file, 'r') as f:
+        inference = dict(json.load(f)["settings"].get("inference", {}))
+    inference.pop("worker_process", None)
+    detectors = {
+        "every_frame": htm.HandDetector(max_hands=2, **dict(inference, keyframe_interval=1)),
+        "keyframes": htm.HandDetector(max_hands=2, **dict(inference, keyframe_interval=keyframe_interval)),
+    }
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Video {path} not found")
+
+    times = {name: [] for name in detectors}
+    errors = []
+    keyframes = mismatched = frames = 0
+    img = None
+    while max_frames is None or frames < max_frames:
+        success, img = cap.read(img)
+        if not success:
+            break
+        if img.shape[1] != w_cam or img.shape[0] != h_cam:
+            img = cv2.resize(img, (w_cam, h_cam))
+
+        hands = {}
+        for name, detector in detectors.items():
+            start = time.perf_counter()
+            detector.find_hands(img, draw=False)
+            hands[name] = detector.find_landmarks(img)
+            times[name].append(time.perf_counter() - start)
+        keyframes += detectors["keyframes"].keyframe
+
+        reference = dict(zip(hands["every_frame"][1], hands["every_frame"][0]))
+        tracked = dict(zip(hands["keyframes"][1], hands["keyframes"][0]))
+        if reference.keys() != tracked.keys():
+            mismatched += 1
+        for label in reference.keys() & tracked.keys():
+            errors.append(float(np.linalg.norm(reference[label][:, :2] - tracked[label][:, :2], axis=-1).mean()))
+        frames += 1
+
+    cap.release()
+    for detector in detectors.values():
+        detector.close()
+
+    detect_ms = {name: float(np.mean(values)) * 1000 if values else 0.0 for name, values in times.items()}
+    return {
+        "source": os.path.basename(path),
+        "frames": frames,
+        "keyframe_interval": keyframe_interval,
+        "keyframe_share": keyframes / frames if frames else 0.0,
+        "detect_ms": detect_ms,
+        "speedup": detect_ms["every_frame"] / detect_ms["keyframes"] if detect_ms["keyframes"] else 0.0,
+        "landmark_error_px": {
+            "mean": float(np.mean(errors)) if errors else 0.0,
+            "p95": float(np.percentile(errors, 95)) if errors else 0.0,
+        },
+        "mismatched_frames": mismatched, # Frames where the two modes saw different hands
+        "environment": environment(),
+    }
+
+
+def print_keyframes(result):
+    print(f"{result['source']}: {result['frames']} frames, keyframe interval up to {result['keyframe_interval']}, "
+          f"inference on {result['keyframe_share']:.0%} of frames")
+    print(f"  detect {result['detect_ms']['every_frame']:.2f} -> {result['detect_ms']['keyframes']:.2f} ms/frame, "
+          f"speedup {result['speedup']:.2f}x")
+    print(f"  landmark error {result['landmark_error_px']['mean']:.2f} px mean, "
+          f"{result['landmark_error_px']['p95']:.2f} px p95, {result['mismatched_frames']} frames with other hands")
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def run(args, draw=True):
+    times = Timings(window=None) # Keep every sample for percentiles
+    hand_control, mouse = make_controller(args, times, draw)
+    trace = [] if args.save_trace else None
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    if args.source.endswith(".npz"):
+        frames = replay_landmarks(load_landmark_trace(args.source), hand_control, times, args.max_frames)
+    elif args.source.endswith(".hclog"):
+        frames = replay_landmarks(SessionLog(args.source).frames(), hand_control, times, args.max_frames)
+    else:
+        frames = replay_video(args.source, hand_control, times, args.fps, args.max_frames, trace)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    hand_control.close()
+    for wait in hand_control.actuator.wait_times:
+        times.add("actuator_wait", wait)
+
+    if trace is not None:
+        save_landmark_trace(args.save_trace, trace)
+
+    return {
+        "source": os.path.basename(args.source),
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "cpu_ms_per_frame": cpu / frames * 1000 if frames else 0.0,
+        "headless": not draw,
+        "stages": times.summary(),
+        "mouse_events": mouse.events,
+        "mouse_costs": mouse.stats(), # Per-event cost of the recording backend itself
+        "launched_apps": len(hand_control._launch_application.launched),
+        "environment": environment(),
+    }
+
+
+# Stages whose p95 grew by more than threshold (share) against a previous result
+def compare(result, baseline, threshold):
+    regressions = []
+    for stage, metrics in result["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or old["p95_ms"] <= 0:
+            continue
+        change = metrics["p95_ms"] / old["p95_ms"] - 1
+        if change > threshold:
+            regressions.append(f"{stage}: p95 {old['p95_ms']:.2f} -> {metrics['p95_ms']:.2f} ms (+{change:.0%})")
+    return regressions
+
+
+def print_result(result):
+    mode = "headless" if result["headless"] else "instrumented"
+    print(f"{result['source']} ({mode}): {result['frames']} frames, {result['fps']:.1f} fps, "
+          f"cpu {result['cpu_ms_per_frame']:.2f} ms/frame")
+    print(f"  {'stage':<14} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  ms")
+    for stage, metrics in result["stages"].items():
+        print(f"  {stage:<14} {metrics['mean_ms']:>8.2f} {metrics['p50_ms']:>8.2f} "
+              f"{metrics['p95_ms']:>8.2f} {metrics['p99_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline HandControl benchmark on recorded video or landmarks")
+    parser.add_argument("source", help="video file, .npz landmark trace or .hclog session log")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--screen-width", type=int, default=1920)
+    parser.add_argument("--screen-height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=30.0, help="frame rate used for replay timestamps")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--output", help="write the result as JSON")
+    parser.add_argument("--save-trace", help="save detected landmarks of a video as .npz")
+    parser.add_argument("--baseline", help="previous JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed p95 growth against baseline")
+    parser.add_argument("--headless", action="store_true", help="run without any overlay drawing")
+    parser.add_argument("--compare-headless", action="store_true",
+                        help="run instrumented and headless modes and report the CPU saved")
+    parser.add_argument("--keyframes", type=int, metavar="N",
+                        help="compare inference every frame with keyframes every N frames and optical flow between")
+    args = parser.parse_args()
+
+    if args.keyframes:
+        if args.source.endswith((".npz", ".hclog")):
+            parser.error("--keyframes needs a video source")
+        result = compare_keyframes(args.source, args.config, args.keyframes, args.width, args.height,
+                                   args.max_frames)
+        print_keyframes(result)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=4)
+        return
+
+    result = run(args, draw=not args.headless)
+    print_result(result)
+
+    if args.compare_headless:
+        args.save_trace = None
+        headless = run(args, draw=False)
+        print_result(headless)
+
+        saved = result["cpu_ms_per_frame"] - headless["cpu_ms_per_frame"]
+        share = saved / result["cpu_ms_per_frame"] if result["cpu_ms_per_frame"] else 0.0
+        print(f"Headless saves {saved:.2f} ms CPU per frame ({share:.0%})")
+        result["headless_comparison"] = {
+            "cpu_ms_per_frame": headless["cpu_ms_per_frame"],
+            "saved_ms_per_frame": saved,
+            "saved_share": share,
+        }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Регрессия: {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
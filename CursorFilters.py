@@ -0,0 +1,216 @@
+import math
+
+# All filters take a point and its timestamp in seconds and return the filtered point,
+# so their behaviour doesn't depend on the camera frame rate
+
+
+class EmaFilter:
+    # Exponential smoothing with a time constant instead of a per-frame factor
+    def __init__(self, tau=0.2):
+        self.tau = tau # Seconds to cover ~63% of a step
+        self.reset()
+
+    def reset(self):
+        self.x = self.y = None
+        self.t = None
+
+    def __call__(self, point, t):
+        if self.t is None:
+            self.x, self.y = point
+        else:
+            dt = max(t - self.t, 1e-6)
+            alpha = 1 - math.exp(-dt / self.tau)
+            self.x += (point[0] - self.x) * alpha
+            self.y += (point[1] - self.y) * alpha
+
+        self.t = t
+        return self.x, self.y
+
+
+class _LowPass:
+    def __init__(self):
+        self.value = None
+
+    def __call__(self, value, alpha):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += (value - self.value) * alpha
+        return self.value
+
+
+class OneEuroFilter:
+    # Casiez et al. One Euro filter: cutoff frequency grows with speed,
+    # so slow motion is smoothed hard and fast motion has little lag
+    def __init__(self, min_cutoff=1.0, beta=0.005, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff # Hz, smoothing at rest
+        self.beta = beta # Cutoff growth per px/s of speed
+        self.d_cutoff = d_cutoff # Hz, smoothing of the speed estimate
+        self.reset()
+
+    def reset(self):
+        self._x = [_LowPass(), _LowPass()]
+        self._dx = [_LowPass(), _LowPass()]
+        self._prev = None
+        self.t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, point, t):
+        if self.t is None:
+            self.t = t
+            self._prev = tuple(point)
+            for axis in range(2):
+                self._x[axis](point[axis], 1.0)
+                self._dx[axis](0.0, 1.0)
+            return self._prev
+
+        dt = max(t - self.t, 1e-6)
+        self.t = t
+
+        result = []
+        for axis in range(2):
+            speed = self._dx[axis]((point[axis] - self._prev[axis]) / dt, self._alpha(self.d_cutoff, dt))
+            cutoff = self.min_cutoff + self.beta * abs(speed)
+            result.append(self._x[axis](point[axis], self._alpha(cutoff, dt)))
+
+        self._prev = tuple(result)
+        return self._prev
+
+
+class KalmanFilter:
+    # Constant-velocity Kalman filter, one independent [position, velocity] state per axis
+    def __init__(self, process_noise=2000.0, measurement_noise=8.0):
+        self.process_noise = process_noise # px/s^2, expected acceleration of the hand
+        self.measurement_noise = measurement_noise # px, landmark jitter
+        self.reset()
+
+    def reset(self):
+        self.state = None # [[x, v], [y, v]]
+        self.cov = None # [[p00, p01, p11]] per axis
+        self.t = None
+
+    def __call__(self, point, t):
+        if self.t is None:
+            self.t = t
+            self.state = [[point[0], 0.0], [point[1], 0.0]]
+            r2 = self.measurement_noise ** 2
+            self.cov = [[r2, 0.0, r2], [r2, 0.0, r2]]
+            return point[0], point[1]
+
+        dt = max(t - self.t, 1e-6)
+        self.t = t
+
+        q2 = self.process_noise ** 2
+        r2 = self.measurement_noise ** 2
+
+        for axis in range(2):
+            x, v = self.state[axis]
+            p00, p01, p11 = self.cov[axis]
+
+            # Predict
+            x += v * dt
+            p00 += 2 * dt * p01 + dt * dt * p11 + q2 * dt ** 4 / 4
+            p01 += dt * p11 + q2 * dt ** 3 / 2
+            p11 += q2 * dt * dt
+
+            # Update with the measured position
+            s = p00 + r2
+            k0, k1 = p00 / s, p01 / s
+            innovation = point[axis] - x
+            x += k0 * innovation
+            v += k1 * innovation
+            p00, p01, p11 = p00 - k0 * p00, p01 - k0 * p01, p11 - k1 * p01
+
+            self.state[axis] = [x, v]
+            self.cov[axis] = [p00, p01, p11]
+
+        return self.state[0][0], self.state[1][0]
+
+
+class CursorPredictor:
+    # Extrapolates the filtered cursor forward by the measured pipeline latency, so it stays
+    # on the finger instead of trailing it. The velocity is smoothed over velocity_tau seconds,
+    # the lead is capped at max_lead seconds and max_distance px against overshoot
+    def __init__(self, max_lead=0.06, max_distance=60.0, velocity_tau=0.04):
+        self.max_lead = max_lead
+        self.max_distance = max_distance
+        self.velocity_tau = velocity_tau
+        self.reset()
+
+    def reset(self):
+        self._prev = None
+        self.velocity = (0.0, 0.0) # px/s
+        self.t = None
+
+    def __call__(self, point, t, latency):
+        if self.t is not None:
+            dt = max(t - self.t, 1e-6)
+            alpha = 1 - math.exp(-dt / self.velocity_tau)
+            self.velocity = tuple(v + ((p - q) / dt - v) * alpha
+                                  for v, p, q in zip(self.velocity, point, self._prev))
+        self._prev = tuple(point)
+        self.t = t
+
+        lead = min(max(latency or 0.0, 0.0), self.max_lead)
+        dx, dy = self.velocity[0] * lead, self.velocity[1] * lead
+        distance = math.hypot(dx, dy)
+        if distance > self.max_distance:
+            dx, dy = dx * self.max_distance / distance, dy * self.max_distance / distance
+        return point[0] + dx, point[1] + dy
+
+
+FILTERS = {
+    "ema": EmaFilter,
+    "one_euro": OneEuroFilter,
+    "kalman": KalmanFilter,
+}
+
+
+# Time constant matching the old per-frame "smoothening" factor at a given frame rate
+def ema_tau_from_smoothening(smoothening, fps=30.0):
+    if smoothening <= 1:
+        return 1e-3
+    return (1.0 / fps) / -math.log(1 - 1.0 / smoothening)
+
+
+# Filter from config["settings"]: "cursor_filter" selects the type and parameters,
+# without it the old smoothening value is kept as an equivalent EMA
+def create_filter(settings):
+    filter_config = dict(settings.get("cursor_filter", {}))
+    filter_type = filter_config.pop("type", "ema")
+
+    if filter_type not in FILTERS:
+        raise ValueError(f"Unknown cursor filter {filter_type}, expected one of {', '.join(FILTERS)}")
+
+    for name, value in filter_config.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Cursor filter {filter_type}: {name} must be a number, got {value!r}")
+
+    if filter_type == "ema" and "tau" not in filter_config:
+        filter_config["tau"] = ema_tau_from_smoothening(settings.get("smoothening", 7))
+
+    try:
+        return FILTERS[filter_type](**filter_config)
+    except TypeError as e:
+        raise ValueError(f"Bad parameters for cursor filter {filter_type}: {e}")
+
+
+# Predictor from config["settings"]["cursor_prediction"], None when it's off (the default)
+def create_predictor(settings):
+    prediction = settings.get("cursor_prediction", {})
+    if not prediction.get("enabled", False):
+        return None
+
+    values = {key: prediction.get(key, default)
+              for key, default in (("max_lead_ms", 60), ("max_distance", 60.0), ("velocity_tau_ms", 40))}
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"cursor_prediction.{key} must be a non-negative number, got {value!r}")
+    if values["velocity_tau_ms"] <= 0:
+        raise ValueError("cursor_prediction.velocity_tau_ms must be positive")
+
+    return CursorPredictor(values["max_lead_ms"] / 1000, values["max_distance"], values["velocity_tau_ms"] / 1000)
@@ -0,0 +1,208 @@
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from HandTrakingModule import HandDetector
+from Timing import Timings
+
+LABELS = ("", "left", "right")
+
+
+def result_dtype(max_hands):
+    return np.dtype([
+        ("n_hands", "u1"),
+        ("labels", "u1", (max_hands,)), # Index in LABELS
+        ("scores", "<f4", (max_hands,)),
+        ("landmarks", "<f4", (max_hands, 21, 3)), # Pixels, as from HandDetector.find_landmarks
+        ("inference", "<f8"), # Seconds spent in find_hands inside the worker
+    ])
+
+
+# Worker process: reads frames from the shared ring, writes landmarks to the shared results.
+# Only slot numbers and commands go through the pipe
+def _worker(conn, frames_name, results_name, slots, slot_size, settings):
+    frames_shm = shared_memory.SharedMemory(frames_name)
+    results_shm = shared_memory.SharedMemory(results_name)
+    detector = HandDetector(**settings)
+    results = np.ndarray((slots,), result_dtype(detector.max_hands), buffer=results_shm.buf)
+    conn.send(("ready",))
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+
+            command = message[0]
+            if command == "frame":
+                _, slot, shape, draw = message
+                img = np.ndarray(shape, np.uint8, buffer=frames_shm.buf, offset=slot * slot_size)
+
+                start = time.perf_counter()
+                detector.find_hands(img, draw) # Draws landmarks in place in the shared frame
+                landmarks, labels, scores = detector._find_landmarks()
+                result = results[slot]
+                n = min(len(labels), detector.max_hands)
+                result["n_hands"] = n
+                result["labels"][:n] = [LABELS.index(label) if label in LABELS else 0 for label in labels[:n]]
+                result["scores"][:n] = scores[:n]
+                result["landmarks"][:n] = landmarks[:n]
+                result["inference"] = time.perf_counter() - start
+                conn.send(("done", slot))
+            elif command == "warm_up":
+                detector.warm_up(*message[1:])
+            elif command == "preload":
+                detector.preload_model(message[1])
+            elif command == "complexity":
+                detector.set_model_complexity(message[1])
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        detector.close()
+        del results
+        frames_shm.close()
+        results_shm.close()
+
+
+class RemoteHandDetector:
+    # HandDetector running in a separate process, so MediaPipe doesn't share the interpreter
+    # (and the GIL) with Tk and the gesture code. Frames travel through a shared-memory ring,
+    # landmarks come back through a shared results array. A crashed or hung worker is restarted
+    def __init__(self, w_cam, h_cam, slots=4, timeout=2.0, timings=None, **settings):
+        self.settings = settings
+        self.max_hands = settings.get("max_hands", 2)
+        self.model_complexity = settings.get("model_complexity", 1)
+        self.timeout = timeout # Seconds to wait for a frame before restarting the worker
+        self.slots = slots
+        self.restarts = 0
+
+        self.timings = timings if timings is not None else Timings() # Per-stage spans
+
+        self._context = mp.get_context("spawn") # No fork of Tk and camera threads
+        self._process = None
+        self._conn = None
+        self._preloaded = set()
+        self._slot = 0
+        self._result = None
+
+        self._dtype = result_dtype(self.max_hands)
+        self._results_shm = shared_memory.SharedMemory(create=True, size=slots * self._dtype.itemsize)
+        self._results = np.ndarray((slots,), self._dtype, buffer=self._results_shm.buf)
+        self._frames_shm = None
+        self._allocate_frames(h_cam * w_cam * 3)
+
+        self._start_worker()
+
+    def _allocate_frames(self, slot_size):
+        if self._frames_shm is not None:
+            self._frames_shm.close()
+            self._frames_shm.unlink()
+        self.slot_size = slot_size
+        self._frames_shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_size)
+
+    def _start_worker(self):
+        self._conn, child_conn = self._context.Pipe()
+        settings = dict(self.settings, model_complexity=self.model_complexity)
+        self._process = self._context.Process(
+            target=_worker, name="hand-detector", daemon=True,
+            args=(child_conn, self._frames_shm.name, self._results_shm.name, self.slots, self.slot_size, settings))
+        self._process.start()
+        child_conn.close()
+
+        # Model loading happens here, not on the first frame
+        try:
+            if not self._conn.poll(60.0):
+                raise EOFError
+            self._conn.recv()
+        except EOFError:
+            self._process.kill()
+            raise RuntimeError("Hand detector process did not start")
+
+        for model_complexity in self._preloaded:
+            self._conn.send(("preload", model_complexity))
+
+    def _stop_worker(self):
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+
+    def _restart_worker(self, reason):
+        print(f"Процесс распознавания перезапущен: {reason}")
+        self.restarts += 1
+        self._stop_worker()
+        self._start_worker()
+
+    def preload_model(self, model_complexity):
+        self._preloaded.add(model_complexity)
+        self._conn.send(("preload", model_complexity))
+
+    # Runs in the worker, doesn't wait for it
+    def warm_up(self, w, h):
+        self._conn.send(("warm_up", w, h))
+
+    def set_model_complexity(self, model_complexity):
+        if model_complexity == self.model_complexity:
+            return
+        self.model_complexity = model_complexity
+        self._conn.send(("complexity", model_complexity))
+
+    def find_hands(self, img, draw=True):
+        if img.nbytes > self.slot_size: # Camera ignored the requested resolution
+            self._stop_worker()
+            self._allocate_frames(img.nbytes)
+            self._start_worker()
+
+        slot = self._slot
+        self._slot = (slot + 1) % self.slots
+
+        with self.timings.span("worker_roundtrip"): # Copy in, inference, reply
+            frame = np.ndarray(img.shape, np.uint8, buffer=self._frames_shm.buf, offset=slot * self.slot_size)
+            frame[...] = img
+
+            self._result = None
+            try:
+                self._conn.send(("frame", slot, img.shape, draw))
+                while self._conn.poll(self.timeout):
+                    message = self._conn.recv()
+                    if message == ("done", slot):
+                        self._result = self._results[slot]
+                        break
+                else:
+                    self._restart_worker("нет ответа" if self._process.is_alive() else "процесс завершился")
+            except (EOFError, BrokenPipeError, OSError) as e:
+                self._restart_worker(e)
+
+        if self._result is not None:
+            self.timings.add("hands.process", float(self._result["inference"]))
+            if draw:
+                img[...] = frame # Landmarks drawn by the worker
+        return img
+
+    def find_landmarks(self, img):
+        with self.timings.span("find_position"):
+            result = self._result
+            if result is None or result["n_hands"] == 0:
+                return np.empty((0, 21, 3), np.float32), [], np.empty(0, np.float32)
+
+            n = int(result["n_hands"])
+            labels = [LABELS[label] for label in result["labels"][:n]]
+            return np.array(result["landmarks"][:n]), labels, np.array(result["scores"][:n])
+
+    def close(self):
+        self._stop_worker()
+        self._result = None
+        del self._results
+        for shm in (self._frames_shm, self._results_shm):
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,170 @@
+import argparse
+import csv
+import json
+import math
+
+import numpy as np
+
+from CursorFilters import EmaFilter, OneEuroFilter, KalmanFilter, create_filter
+
+
+# Trace: (N, 3) array of [t, x, y], t in seconds, x/y in pixels
+def load_trace(path):
+    if path.endswith(".npy"):
+        trace = np.load(path)
+    else:
+        with open(path, newline='') as f:
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith("t")]
+        trace = np.array(rows, dtype=np.float64)
+
+    if trace.ndim != 2 or trace.shape[1] < 3:
+        raise ValueError(f"Trace {path} must have t, x, y columns")
+    return trace[:, :3].astype(np.float64)
+
+
+def save_trace(path, trace):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["t", "x", "y"])
+        writer.writerows(trace.tolist())
+
+
+# Hand that holds still, moves, and holds still again, with landmark noise
+def synthetic_trace(seconds=10.0, fps=30.0, noise=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, seconds, 1.0 / fps)
+    phase = np.clip((t % 4.0) - 1.5, 0, 1.0) # 1.5 s rest, 1 s move, 1.5 s rest
+    direction = np.floor(t / 4.0) % 2
+    x = 200 + 400 * np.where(direction == 0, phase, 1 - phase)
+    y = 300 + 100 * np.sin(2 * math.pi * 0.3 * t)
+    return np.column_stack([t, x + rng.normal(0, noise, t.size), y + rng.normal(0, noise, t.size)])
+
+
+# Non-causal centred moving average: the zero-lag "true" path to compare against
+def _reference(trace, window):
+    kernel = np.ones(window) / window
+    ref = np.empty_like(trace[:, 1:])
+    for axis in range(2):
+        padded = np.pad(trace[:, 1 + axis], window // 2, mode="edge")
+        ref[:, axis] = np.convolve(padded, kernel, mode="valid")[:len(trace)]
+    return ref
+
+
+def run_filter(filter_, trace):
+    filter_.reset()
+    return np.array([filter_((x, y), t) for t, x, y in trace])
+
+
+# jitter: RMS frame-to-frame movement of the output while the hand is still (px)
+# lag: shift of the output velocity that best matches the reference velocity (ms)
+# error: RMS distance from the reference path while moving (px)
+def evaluate(filtered, trace, ref_window=5, rest_speed=40.0, max_lag_frames=15):
+    dt = np.median(np.diff(trace[:, 0]))
+    ref = _reference(trace, ref_window)
+
+    ref_speed = np.hypot(*np.gradient(ref, axis=0).T) / dt
+    still = ref_speed < rest_speed
+    moving = ~still
+
+    steps = np.hypot(*np.diff(filtered, axis=0).T)
+    jitter = float(np.sqrt(np.mean(steps[still[1:]] ** 2))) if still[1:].any() else 0.0
+
+    ref_vel = np.gradient(ref[:, 0])
+    out_vel = np.gradient(filtered[:, 0])
+    best_lag, best_score = 0, -np.inf
+    for lag in range(0, max_lag_frames + 1):
+        a = ref_vel[:len(ref_vel) - lag] if lag else ref_vel
+        b = out_vel[lag:]
+        score = float(np.dot(a, b))
+        if score > best_score:
+            best_lag, best_score = lag, score
+
+    error = np.hypot(*(filtered - ref).T)
+    moving_error = float(np.sqrt(np.mean(error[moving] ** 2))) if moving.any() else 0.0
+
+    return {
+        "jitter_px": jitter,
+        "lag_ms": best_lag * dt * 1000,
+        "moving_error_px": moving_error,
+    }
+
+
+def default_filters(config_file):
+    filters = {
+        "ema": EmaFilter(),
+        "one_euro": OneEuroFilter(),
+        "kalman": KalmanFilter(),
+    }
+    try:
+        with open(config_file, 'r') as f:
+            settings = json.load(f)["settings"]
+        filters["config"] = create_filter(settings)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Фильтр из конфига не загружен: {e}")
+    return filters
+
+
+def benchmark(trace, filters):
+    return {name: evaluate(run_filter(filter_, trace), trace) for name, filter_ in filters.items()}
+
+
+# Record the index fingertip from the camera into a trace file
+def record(path, seconds, w_cam=640, h_cam=360):
+    import cv2
+    import time
+    import HandTrakingModule as htm
+
+    cap = cv2.VideoCapture(0)
+    cap.set(3, w_cam)
+    cap.set(4, h_cam)
+    detector = htm.HandDetector(max_hands=1)
+
+    rows = []
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        success, img = cap.read()
+        if not success:
+            break
+        t = time.monotonic() - start
+        detector.find_hands(img, draw=False)
+        landmarks, _, _ = detector.find_landmarks(img)
+        if len(landmarks):
+            rows.append([t, landmarks[0, 8, 0], landmarks[0, 8, 1]])
+
+    cap.release()
+    save_trace(path, np.array(rows))
+    print(f"Записано {len(rows)} точек в {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jitter vs lag of cursor filters on landmark traces")
+    parser.add_argument("traces", nargs="*", help="CSV (t,x,y) or .npy traces")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--record", help="record a trace from the camera to this CSV file")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.seconds)
+        return
+
+    traces = {path: load_trace(path) for path in args.traces} or {"synthetic": synthetic_trace()}
+    filters = default_filters(args.config)
+
+    results = {}
+    for name, trace in traces.items():
+        results[name] = benchmark(trace, filters)
+        print(f"{name} ({len(trace)} points)")
+        print(f"  {'filter':<10} {'jitter px':>10} {'lag ms':>8} {'error px':>9}")
+        for filter_name, metrics in results[name].items():
+            print(f"  {filter_name:<10} {metrics['jitter_px']:>10.2f} {metrics['lag_ms']:>8.1f} "
+                  f"{metrics['moving_error_px']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+# Reuse a preallocated buffer if it fits, otherwise allocate a new one (first frame / size change)
+def ensure_buffer(buf, shape, dtype=np.uint8):
+    if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+        return np.empty(shape, dtype)
+    return buf
+
+
+class FramePool:
+    # Fixed set of frame buffers shared by the pipeline stages.
+    # Frames are acquired by capture and released after display or when dropped,
+    # so in the steady state no frame memory is allocated
+    def __init__(self, shape, count=8, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.count = count
+
+        self.misses = 0 # Acquires that had to allocate
+
+        self._free = deque(np.empty(self.shape, dtype) for _ in range(count))
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.popleft()
+            self.misses += 1
+        return np.empty(self.shape, self.dtype)
+
+    def release(self, buf):
+        # Frames of another size (camera ignored the requested resolution) are left to the GC
+        if buf is None or buf.shape != self.shape or buf.dtype != self.dtype:
+            return
+
+        with self._lock:
+            if len(self._free) < self.count:
+                self._free.append(buf)
+
+    def available(self):
+        with self._lock:
+            return len(self._free)
+
+
+class DoubleBuffer:
+    # Producer writes into the back buffer and publishes it, the consumer (Tk main loop)
+    # reads the front one. The lock is held only for the swap and while reading
+    def __init__(self):
+        self.published = 0
+        self.consumed = 0
+
+        self._buffers = [None, None]
+        self._front = 0
+        self._fresh = False
+        self._lock = threading.Lock()
+
+    def back(self, shape):
+        back = 1 - self._front
+        self._buffers[back] = ensure_buffer(self._buffers[back], shape)
+        return self._buffers[back]
+
+    def publish(self):
+        with self._lock:
+            self._front = 1 - self._front
+            self._fresh = True
+            self.published += 1
+
+    # True while the last published frame hasn't been read yet
+    def pending(self):
+        return self._fresh
+
+    # Calls read(frame) with the newest frame, if there is one. Returns whether it was called
+    def consume(self, read):
+        with self._lock:
+            if not self._fresh:
+                return False
+            self._fresh = False
+            self.consumed += 1
+            read(self._buffers[self._front])
+        return True
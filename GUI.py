@@ -1,11 +1,17 @@
 import json
 import os
+import time
 import cv2
 import threading
 import customtkinter as ctk
+import tkinter as tk
 from tkinter import messagebox
-from PIL import Image
-from HandMouse import HandControl
+from PIL import Image, ImageTk
+from Pipeline import Pipeline
+from LiveConfig import ConfigSnapshot
+from FramePool import ensure_buffer, DoubleBuffer
+from MultiCamera import open_cameras
+from GestureState import TIMING_DEFAULTS, gesture_timing
 
 
 class GUI(ctk.CTk):
@@ -29,6 +35,20 @@ class GUI(ctk.CTk):
         self.camera_running = False
         self.cap = None
         self._hand_control_running = False
+        self._hand_thread = None
+        self._session = 0 # Start counter: a stopping session must not pick up the next one's flag
+
+        # HandControl is imported and created in the background and reused across start/stop,
+        # captures stay open for the next start and the camera preview
+        self.hand_control = None
+        self.caps = None
+        self.startup_times = {}
+        self._warm_up_thread = None
+        self.start_warm_up()
+
+        # Reused frame buffers for the camera preview
+        self._capture_frame = None
+        self._preview_buffer = None
 
         # Setup window
         self.geometry("1000x700")
@@ -41,6 +61,71 @@ class GUI(ctk.CTk):
 
         self.show_main_menu()
 
+    # Import, model load and a first inference off the main thread, so the menu shows at once
+    def start_warm_up(self):
+        self._warm_up_thread = threading.Thread(target=self._warm_up, name="warm-up", daemon=True)
+        self._warm_up_thread.start()
+
+    def _warm_up(self):
+        try:
+            start = time.perf_counter()
+            from HandMouse import HandControl # Pulls in mediapipe
+            imported = time.perf_counter()
+            hand_control = HandControl(640, 360)
+            created = time.perf_counter()
+            hand_control.warm_up()
+            warmed = time.perf_counter()
+        except Exception as e:
+            print(f"Ошибка загрузки модели: {e}")
+            return
+
+        self.startup_times.update({"import": imported - start, "model": created - imported,
+                                   "warm_up": warmed - created})
+        self.hand_control = hand_control
+        print(f"[startup] import {imported - start:.2f} s, model {created - imported:.2f} s, "
+              f"warm-up {warmed - created:.2f} s")
+
+    # Hand the saved config to the controller: gestures and tunables are swapped in
+    # between frames, detector and camera changes need a new controller
+    def publish_config(self):
+        if self.hand_control is None or self._warm_up_thread.is_alive():
+            self.reload_hand_control() # Loading may have read the old file
+        elif self.hand_control.publish_config(self.config_data):
+            self.reload_hand_control()
+
+    # Config changed: the next start gets a controller (and cameras) built from it.
+    # The old controller is closed and the new one loaded in the background
+    def reload_hand_control(self):
+        self._hand_control_running = False
+        if self._hand_thread:
+            self._hand_thread.join(timeout=2.0) # Stops within a pipeline poll timeout
+        self.release_cameras()
+
+        previous = self._warm_up_thread
+
+        def reload():
+            previous.join()
+            if self.hand_control is not None:
+                self.hand_control.close()
+                self.hand_control = None
+            self._warm_up()
+
+        self._warm_up_thread = threading.Thread(target=reload, name="warm-up", daemon=True)
+        self._warm_up_thread.start()
+
+    def get_cameras(self):
+        if self.caps is None:
+            sources = self.config_data["settings"].get("cameras", {}).get("sources", [0])
+            self.caps = open_cameras(sources, 640, 360)
+        return self.caps
+
+    def release_cameras(self):
+        if self.caps:
+            for cap in self.caps:
+                cap.release()
+        self.caps = None
+        self.cap = None
+
     def load_config(self):
         if os.path.exists(self.config_file):
             with open(self.config_file, 'r', encoding='utf-8') as f:
@@ -53,14 +138,33 @@ class GUI(ctk.CTk):
                     "smoothening": 7,
                     "frame_reduction": 0.1,
                     "adapter_for_cam": 50,
-                    "click_delay": 20
+                    "gesture_enter_ms": 50,
+                    "gesture_exit_ms": 100,
+                    "click_repeat_ms": 670,
+                    "cursor_filter": {"type": "one_euro", "min_cutoff": 1.0, "beta": 0.005, "d_cutoff": 1.0},
+                    "cursor_prediction": {"enabled": False, "max_lead_ms": 60, "max_distance": 60,
+                                          "velocity_tau_ms": 40},
+                    "cursor_output": {"rate_hz": 0},
+                    "output": {"backend": "pynput"},
+                    "inference": {"roi_tracking": False, "roi_padding": 0.35, "full_frame_interval": 30,
+                                  "adaptive_resolution": False, "target_fps": 30, "min_scale": 0.5,
+                                  "keyframe_interval": 1, "keyframe_speed": 0.05, "flow_min_tracked": 0.8,
+                                  "worker_process": False},
+                    "timings": {"overlay": False, "export": "", "export_interval": 1.0},
+                    "preview_fps": 30,
+                    "scroll": {"mode": "displacement", "speed": 10.0, "gain": 0.25, "dead_zone": 10,
+                               "max_speed": 60.0, "rate_hz": 60},
+                    "cameras": {"sources": [0], "fusion": "select", "max_age": 0.1,
+                                "switch_margin": 0.1, "min_hold": 0.5},
+                    "governor": {"enabled": False, "idle_after": 1.5, "idle_fps": 8, "active_fps": 30,
+                                 "wake_frames": 1, "idle_model_complexity": 0}
                 },
                 "gestures": {
                     "right_hand": {
                         "move_mouse": {"fingers_up": [0, 1, 0, 0, 0]},
                         "left_one_click": {"fingers_up": [1, 1, 0, 0, 0]},
                         "left_double_click": {"fingers_up": [0, 1, 1, 0, 0]},
-                        "right_click": {"fingers_up": [1, 1, 1, 0, 0], "distance_threshold": 40},
+                        "right_click": {"fingers_up": [1, 1, 1, 0, 0]},
                         "scroll_up": {"fingers_up": [0, 1, 1, 1, 1]},
                         "scroll_down": {"fingers_up": [1, 0, 0, 0, 0]},
                         "hold_and_move": {"fingers_up": [0, 0, 0, 0, 0]},
@@ -87,12 +191,13 @@ class GUI(ctk.CTk):
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.config_data, f, indent=4, ensure_ascii=False)
-            return True
-
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось сохранить настройки: {str(e)}")
             return False
 
+        self.publish_config() # The running controller is reused across starts
+        return True
+
     def clear_frame(self):
         for widget in self.main_frame.winfo_children():
             widget.destroy()
@@ -212,24 +317,18 @@ class GUI(ctk.CTk):
         self.camera_label = ctk.CTkLabel(self.camera_frame, text="")
         self.camera_label.pack(fill="both", expand=True)
 
-        # Start cam
-        self.cap = cv2.VideoCapture(0)
+        # Start the primary cam, shared with hand control: wait until it lets go of it
+        if self._hand_thread:
+            self._hand_thread.join(timeout=2.0)
+        self.cap = self.get_cameras()[0]
         self.camera_running = True
         self.show_camera_feed()
 
     def show_camera_feed(self):
         if self.camera_running:
-            ret, frame = self.cap.read()
+            ret, self._capture_frame = self.cap.read(self._capture_frame)
             if ret:
-                # Convert BGR -> RGB
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # Scaling
-                h, w = frame.shape[:2]
-                aspect_ratio = w / h
-                new_height = 500
-                new_width = int(new_height * aspect_ratio)
-                frame = cv2.resize(frame, (new_width, new_height))
+                frame, new_width, new_height = self.scale_preview(self._capture_frame)
 
                 # Sending video to frame
                 img = Image.fromarray(frame)
@@ -240,9 +339,25 @@ class GUI(ctk.CTk):
 
             self.after(10, self.show_camera_feed)
 
+    def preview_size(self, frame, new_height=500):
+        h, w = frame.shape[:2]
+        aspect_ratio = w / h
+        return int(new_height * aspect_ratio), new_height
+
+    # Scale a BGR frame for the preview and convert it to RGB in a reused buffer
+    def scale_preview(self, frame, dst=None):
+        new_width, new_height = self.preview_size(frame)
+
+        if dst is None:
+            self._preview_buffer = ensure_buffer(self._preview_buffer, (new_height, new_width, 3))
+            dst = self._preview_buffer
+        cv2.resize(frame, (new_width, new_height), dst=dst)
+        cv2.cvtColor(dst, cv2.COLOR_BGR2RGB, dst=dst)
+
+        return dst, new_width, new_height
+
+    # The capture stays open for the next start
     def stop_camera(self):
-        if self.cap:
-            self.cap.release()
         self.camera_running = False
 
     def show_update_config(self):
@@ -293,9 +408,21 @@ class GUI(ctk.CTk):
                 gesture_data["command_var"].get()
 
         # Сохраняем общие настройки
-        for key in ["smoothening", "frame_reduction", "adapter_for_cam", "click_delay"]:
+        for key in ["smoothening", "frame_reduction", "adapter_for_cam",
+                    "gesture_enter_ms", "gesture_exit_ms", "click_repeat_ms"]:
             var = getattr(self, f"{key}_var")
             self.config_data["settings"][key] = var.get()
+        self.config_data["settings"].pop("click_delay", None) # Frames, replaced by the ms settings
+
+        # Check gestures and settings before they reach the controller
+        try:
+            conflicts = ConfigSnapshot(self.config_data).conflicts
+        except (ValueError, TypeError, KeyError) as e:
+            messagebox.showerror("Ошибка", f"Некорректные настройки: {e}")
+            return
+
+        if conflicts:
+            messagebox.showwarning("Конфликт жестов", "\n".join(conflicts))
 
         if self.save_config():
             messagebox.showinfo("Успех", "Настройки успешно сохранены!")
@@ -310,11 +437,17 @@ class GUI(ctk.CTk):
 
         # Setting display
         settings = [
-            ("Сглаживание", "smoothening", "int"),
+            ("Сглаживание (фильтр EMA)", "smoothening", "int"),
             ("Уменьшение кадра", "frame_reduction", "float"),
             ("Адаптер камеры", "adapter_for_cam", "int"),
-            ("Задержка клика", "click_delay", "int")
+            ("Удержание жеста, мс", "gesture_enter_ms", "int"),
+            ("Отпускание жеста, мс", "gesture_exit_ms", "int"),
+            ("Повтор клика, мс", "click_repeat_ms", "int")
         ]
+        # Smoothening only sets up the ema filter without its own tau, other filters ignore it
+        cursor_filter = self.config_data["settings"].get("cursor_filter", {})
+        ema_fallback = cursor_filter.get("type", "ema") == "ema" and "tau" not in cursor_filter
+        defaults = dict(TIMING_DEFAULTS, click_repeat_ms=gesture_timing(self.config_data["settings"])["click_repeat"] * 1000)
 
         for i, (label, key, var_type) in enumerate(settings):
             frame = ctk.CTkFrame(scroll_frame)
@@ -326,10 +459,11 @@ class GUI(ctk.CTk):
                 font=ctk.CTkFont(family="Arial", size=14)
             ).pack(side="left", padx=5)
 
+            value = self.config_data["settings"].get(key, defaults.get(key))
             if var_type == "int":
-                var = ctk.IntVar(value=self.config_data["settings"][key])
+                var = ctk.IntVar(value=int(value))
             else:
-                var = ctk.DoubleVar(value=self.config_data["settings"][key])
+                var = ctk.DoubleVar(value=value)
 
             setattr(self, f"{key}_var", var)
 
@@ -340,6 +474,8 @@ class GUI(ctk.CTk):
                 font=ctk.CTkFont(family="Arial", size=14)
             )
             entry.pack(side="right", padx=5)
+            if key == "smoothening" and not ema_fallback:
+                entry.configure(state="disabled")
 
     def create_right_hand_tab(self):
         # Create frame
@@ -621,6 +757,8 @@ class GUI(ctk.CTk):
             self.show_update_config()
 
     def start_handcrtl(self):
+        clicked = time.perf_counter()
+        warm = self.hand_control is not None and not self._warm_up_thread.is_alive() # Loaded in the background
         self.clear_frame()
         self.create_header("Управление мышью")
 
@@ -628,48 +766,116 @@ class GUI(ctk.CTk):
         self.camera_frame = ctk.CTkFrame(self.main_frame)
         self.camera_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
 
-        self.camera_label = ctk.CTkLabel(self.camera_frame, text="")
+        # Plain Tk label: its PhotoImage is created once and refreshed with paste()
+        self.camera_label = tk.Label(self.camera_frame, bd=0, highlightthickness=0,
+                                     text="" if warm else "Загрузка модели...")
         self.camera_label.pack(fill="both", expand=True)
+        self._preview_photo = None
+
+        # Worker publishes preview frames, the Tk main loop shows them at most preview_fps times a second
+        self.preview = DoubleBuffer()
+        preview_fps = self.config_data["settings"].get("preview_fps", 30)
+        if isinstance(preview_fps, bool) or not isinstance(preview_fps, (int, float)) or preview_fps <= 0:
+            preview_fps = 30 # A broken value shouldn't take the Tk thread down
+        self.preview_interval = max(1, int(1000 / preview_fps)) # Never a 0 ms busy loop
+
+        # Per-stage timings on the preview
+        self.show_timings = self.config_data["settings"].get("timings", {}).get("overlay", False)
+        self.show_timings_var = ctk.BooleanVar(value=self.show_timings)
+        ctk.CTkCheckBox(
+            self.main_frame,
+            text="Показывать тайминги",
+            variable=self.show_timings_var,
+            command=lambda: setattr(self, "show_timings", self.show_timings_var.get()),
+            font=ctk.CTkFont(family="Arial", size=12)
+        ).pack(pady=(0, 10))
 
         # Start app with threading
-        def run_hand_control():
-            w_cam, h_cam = 640, 360
-            hand_control = HandControl(w_cam, h_cam)
-
-            cap = cv2.VideoCapture(0)
-            cap.set(3, w_cam)
-            cap.set(4, h_cam)
-
-            self._hand_control_running = True
-
-            while hasattr(self, '_hand_control_running') and self._hand_control_running:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame = hand_control._process_frame(frame)
-
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w = frame.shape[:2]
-                aspect_ratio = w / h
-                new_height = 500
-                new_width = int(new_height * aspect_ratio)
-                frame = cv2.resize(frame, (new_width, new_height))
-
-                img = Image.fromarray(frame)
-                imgtk = ctk.CTkImage(light_image=img, size=(new_width, new_height))
-
-                self.camera_label.configure(image=imgtk)
-                self.camera_label.image = imgtk
+        self._hand_control_running = True
+        self._session += 1
+        session = self._session
+        previous = self._hand_thread
 
-                self.update()
+        def running():
+            return self._hand_control_running and self._session == session
 
-            cap.release()
+        def run_hand_control():
+            if previous:
+                previous.join() # Same controller and cameras
+            self._warm_up_thread.join()
+            if self.hand_control is None:
+                self._warm_up() # Background load failed, one more try
+            if self.hand_control is None or not running():
+                return
 
-        threading.Thread(target=run_hand_control, daemon=True).start()
+            hand_control = self.hand_control
+            hand_control.reset()
+            caps = self.get_cameras()
+
+            pipeline = Pipeline(caps, hand_control)
+            pipeline.start()
+            first_frame = True
+
+            # Runs in this worker thread: no Tk calls here, only the hand-off to the main loop
+            def show(packet):
+                nonlocal first_frame
+                if first_frame:
+                    first_frame = False
+                    kind = "warm_start" if warm else "cold_start"
+                    self.startup_times[kind] = time.perf_counter() - clicked
+                    print(f"[startup] {'тёплый' if warm else 'холодный'} старт: "
+                          f"первый кадр через {self.startup_times[kind]:.2f} s")
+
+                if self.preview.pending():
+                    # The GUI hasn't shown the previous frame yet, skip the preview work
+                    return running()
+
+                if self.show_timings:
+                    hand_control.timings.draw(packet.img)
+
+                with hand_control.timings.span("gui_handoff"):
+                    new_width, new_height = self.preview_size(packet.img)
+                    self.scale_preview(packet.img, dst=self.preview.back((new_height, new_width, 3)))
+                    self.preview.publish()
+
+                return running()
+
+            pipeline.run_display(show)
+            print(pipeline.report())
+            print(hand_control.actuator.report())
+            hand_control.reset() # Don't leave a button held
+
+        self._hand_thread = threading.Thread(target=run_hand_control, daemon=True)
+        self._hand_thread.start()
+        self.after(self.preview_interval, self.refresh_preview)
+
+    # Tk main loop side of the preview: show the newest published frame
+    def refresh_preview(self):
+        if not self._hand_control_running and self.preview.published:
+            return
+        if not self.camera_label.winfo_exists():
+            return
+
+        self.preview.consume(self._paste_preview)
+        self.after(self.preview_interval, self.refresh_preview)
+
+    def _paste_preview(self, frame):
+        img = Image.fromarray(frame)
+        if self._preview_photo is None or \
+                (self._preview_photo.width(), self._preview_photo.height()) != img.size:
+            self._preview_photo = ImageTk.PhotoImage(img)
+            self.camera_label.configure(image=self._preview_photo)
+        else:
+            self._preview_photo.paste(img)
 
     def exit(self):
         if messagebox.askyesno("Выход", "Вы уверены, что хотите выйти?"):
+            self._hand_control_running = False
+            if self._hand_thread:
+                self._hand_thread.join(timeout=2.0)
+            if self.hand_control is not None:
+                self.hand_control.close()
+            self.release_cameras()
             self.destroy()
 
 
@@ -0,0 +1,69 @@
+# Timing settings (ms) with their defaults, flat in "settings" like the other tunables
+TIMING_DEFAULTS = {
+    "gesture_enter_ms": 50, # A gesture must be seen this long before it's pressed
+    "gesture_exit_ms": 100, # and be gone this long before it's released
+    "click_repeat_ms": 670, # Repeat period of a held click gesture
+}
+
+
+# Timing settings in seconds. Configs from before the ms settings have "click_delay"
+# in frames, counted at about 30 fps
+def gesture_timing(settings):
+    timing = {key: settings.get(key, default) for key, default in TIMING_DEFAULTS.items()}
+    legacy = "click_repeat_ms" not in settings and "click_delay" in settings
+    if legacy:
+        timing["click_repeat_ms"] = settings["click_delay"]
+    for key, value in timing.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{'click_delay' if legacy and key == 'click_repeat_ms' else key} "
+                             f"must be a non-negative number, got {value!r}")
+    if legacy:
+        timing["click_repeat_ms"] *= 1000 / 30
+    return {key[:-3]: value / 1000 for key, value in timing.items()}
+
+
+class GestureStateMachine:
+    # Debounces the per-frame gesture of one hand by time, not by frames, so it behaves
+    # the same at any FPS. A gesture is pressed once it has been stable for `enter`
+    # seconds, repeats every repeat[action] seconds while held, and is released
+    # after it has been missing for `exit` seconds. update() returns the events
+    # as (event, action) with event "press", "repeat" or "release"
+    def __init__(self, enter=0.05, exit=0.1, repeat=None):
+        self.enter = enter
+        self.exit = exit
+        self.repeat = repeat or {} # action -> seconds, actions without one don't repeat
+        self.reset()
+
+    def reset(self):
+        self.active = "" # Pressed gesture
+        self._candidate = ""
+        self._candidate_since = 0.0
+        self._last_seen = 0.0
+        self._last_repeat = 0.0
+
+    # action: gesture recognized in this frame, "" for none (or no hand)
+    def update(self, action, t):
+        events = []
+
+        if action != self._candidate:
+            self._candidate = action
+            self._candidate_since = t
+
+        if self.active:
+            if action == self.active:
+                self._last_seen = t
+                period = self.repeat.get(self.active)
+                if period and t - self._last_repeat >= period:
+                    events.append(("repeat", self.active))
+                    # Keep the cadence at low FPS, but never fire a burst to catch up
+                    self._last_repeat = max(self._last_repeat + period, t - period)
+            elif t - self._last_seen >= self.exit:
+                events.append(("release", self.active))
+                self.active = ""
+
+        if not self.active and action and action == self._candidate and t - self._candidate_since >= self.enter:
+            self.active = action
+            self._last_seen = self._last_repeat = t
+            events.append(("press", action))
+
+        return events
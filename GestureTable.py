@@ -0,0 +1,144 @@
+import numpy as np
+
+# Actions that can be bound to right hand gestures
+RIGHT_HAND_ACTIONS = (
+    "move_mouse",
+    "left_one_click",
+    "left_double_click",
+    "right_click",
+    "scroll_up",
+    "scroll_down",
+    "hold_and_move",
+    "release",
+)
+
+# Bit weights for the 5-bit finger code: thumb is bit 0, pinky is bit 4
+FINGER_WEIGHTS = np.array([1, 2, 4, 8, 16], np.int32)
+
+FINGER_NAMES = ("thumb", "index", "middle", "ring", "pinky")
+
+
+def fingers_to_code(fingers):
+    return sum(int(up) << i for i, up in enumerate(fingers))
+
+
+# Vectorized codes for a (hands, 5) fingers array
+def fingers_to_codes(fingers):
+    return fingers.astype(np.int32) @ FINGER_WEIGHTS
+
+
+def code_to_fingers(code):
+    return [(code >> i) & 1 for i in range(5)]
+
+
+def _validate_fingers(fingers, where):
+    if not isinstance(fingers, list) or len(fingers) != 5 or any(f not in (0, 1) for f in fingers):
+        raise ValueError(f"{where}: fingers_up must be a list of five 0/1 values, got {fingers!r}")
+
+
+# Pinch gestures: a right hand gesture with "distance_threshold" (percent of palm size)
+# fires when the fingertips in "pinch" (default thumb and index) are closer than that
+# and all five fingers, the pinched ones included, match fingers_up. They are checked
+# before the finger code table.
+# Returns [(action, finger_a, finger_b, threshold in palm sizes, fingers_up)]
+def compile_pinches(config):
+    pinches = []
+    for action, gesture in config["gestures"]["right_hand"].items():
+        if "distance_threshold" not in gesture:
+            continue
+
+        pair = gesture.get("pinch", ["thumb", "index"])
+        if not isinstance(pair, list) or len(pair) != 2 or any(name not in FINGER_NAMES for name in pair) \
+                or pair[0] == pair[1]:
+            raise ValueError(f"right_hand.{action}: pinch must be two different fingers of {FINGER_NAMES}")
+        threshold = gesture["distance_threshold"]
+        if not isinstance(threshold, (int, float)) or threshold <= 0:
+            raise ValueError(f"right_hand.{action}: distance_threshold must be a positive percent")
+
+        pinches.append((action, FINGER_NAMES.index(pair[0]), FINGER_NAMES.index(pair[1]), threshold / 100,
+                        list(gesture["fingers_up"])))
+    return pinches
+
+
+# Codes a pinch reads as when the pinched fingers curl, as they do in a natural pinch
+def _curled_codes(fingers, pair):
+    fingers_up = [i for i in range(5) if FINGER_NAMES[i] in pair and fingers[i]]
+    codes = set()
+    for mask in range(1, 1 << len(fingers_up)):
+        curled = list(fingers)
+        for bit, finger in enumerate(fingers_up):
+            if mask >> bit & 1:
+                curled[finger] = 0
+        codes.add(fingers_to_code(curled))
+    return sorted(codes)
+
+
+# Compile config["gestures"] into lookup tables keyed by finger code:
+#   right_hand: code -> action name (pinch gestures excluded, see compile_pinches)
+#   left_hand: code -> (app name, command)
+# Duplicate codes within one hand are errors. Overlaps between hands are returned
+# as warnings (a misdetected handedness would trigger the other hand's action),
+# as are pinches sharing fingers with a code gesture (which then fires only unpinched)
+# and pinches whose curled pose is a code gesture (which fires instead of the pinch)
+def compile_gestures(config):
+    try:
+        right_config = config["gestures"]["right_hand"]
+        apps_config = config["gestures"]["left_hand"]["app_launch"]["gestures"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Config has no gestures section {e}")
+
+    right_hand = {}
+    pinches = [] # (code, action, curled codes)
+    for action, gesture in right_config.items():
+        if action not in RIGHT_HAND_ACTIONS:
+            raise ValueError(f"right_hand.{action}: unknown action")
+        if "fingers_up" not in gesture:
+            raise ValueError(f"right_hand.{action}: fingers_up is missing")
+        _validate_fingers(gesture["fingers_up"], f"right_hand.{action}")
+
+        code = fingers_to_code(gesture["fingers_up"])
+        if "distance_threshold" in gesture:
+            pinches.append((code, action, _curled_codes(gesture["fingers_up"],
+                                                        gesture.get("pinch", ["thumb", "index"]))))
+            continue
+
+        if code in right_hand:
+            raise ValueError(
+                f"right_hand: {action} and {right_hand[code]} share fingers {gesture['fingers_up']}"
+            )
+        right_hand[code] = action
+
+    left_hand = {}
+    for app_name, gesture in apps_config.items():
+        where = f"left_hand.app_launch.{app_name}"
+        if "fingers_up" not in gesture:
+            raise ValueError(f"{where}: fingers_up is missing")
+        _validate_fingers(gesture["fingers_up"], where)
+        if not str(gesture.get("command", "")).strip():
+            raise ValueError(f"{where}: command is empty")
+
+        code = fingers_to_code(gesture["fingers_up"])
+        if code in left_hand:
+            raise ValueError(
+                f"left_hand: {app_name} and {left_hand[code][0]} share fingers {gesture['fingers_up']}"
+            )
+        left_hand[code] = (app_name, gesture["command"])
+
+    conflicts = [
+        f"{right_hand[code]} (right hand) and {left_hand[code][0]} (left hand) share fingers "
+        f"{code_to_fingers(code)}"
+        for code in sorted(right_hand.keys() & left_hand.keys())
+    ]
+    for code, action, curled_codes in pinches:
+        if code in right_hand:
+            conflicts.append(f"{action} (pinch) and {right_hand[code]} (right hand) share fingers "
+                             f"{code_to_fingers(code)}")
+        if code in left_hand:
+            conflicts.append(f"{action} (pinch) and {left_hand[code][0]} (left hand) share fingers "
+                             f"{code_to_fingers(code)}")
+        for curled in curled_codes:
+            if curled in right_hand:
+                conflicts.append(f"{action} (pinch) reads as {right_hand[curled]} (right hand) with the pinched "
+                                 f"fingers curled {code_to_fingers(curled)}")
+
+    return right_hand, left_hand, conflicts
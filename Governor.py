@@ -0,0 +1,76 @@
+class Governor:
+    # Lowers capture rate and model complexity while no hand is in view,
+    # and switches back as soon as a hand is detected again.
+    # The governor only picks model_complexity, every camera's thread applies it to its own
+    # detector before the next frame: a remote detector's pipe isn't shared between threads
+    ACTIVE = "active"
+    IDLE = "idle"
+
+    def __init__(self, detectors, idle_after=1.5, idle_fps=8, active_fps=30, wake_frames=1,
+                 idle_model_complexity=0, enabled=True):
+        self.detectors = detectors # One per camera, switched together
+        self.enabled = enabled
+        self.idle_after = idle_after # Seconds without a hand before going idle
+        self.idle_fps = idle_fps
+        self.active_fps = active_fps
+        self.wake_frames = wake_frames # Frames with a hand needed to wake up
+        self.idle_model_complexity = idle_model_complexity
+        self.active_model_complexity = detectors[0].model_complexity
+        self.model_complexity = self.active_model_complexity
+
+        self.mode = self.ACTIVE
+        self.switches = 0
+
+        self._last_hand_time = None
+        self._hand_frames = 0
+
+        # Load the light model up front so going idle doesn't stall a frame
+        if enabled:
+            for detector in detectors:
+                detector.preload_model(idle_model_complexity)
+
+    @property
+    def fps(self):
+        return self.active_fps if self.mode == self.ACTIVE else self.idle_fps
+
+    # Minimum time between captures, 0 - as fast as the camera delivers
+    @property
+    def frame_interval(self):
+        if not self.enabled or self.mode == self.ACTIVE:
+            return 0.0
+        return 1.0 / self.idle_fps
+
+    # Back to active for a new session
+    def reset(self):
+        if self.mode == self.IDLE:
+            self._set_mode(self.ACTIVE, self.active_model_complexity)
+        self._last_hand_time = None
+        self._hand_frames = 0
+
+    def update(self, n_hands, now):
+        if not self.enabled:
+            return
+
+        if self._last_hand_time is None:
+            self._last_hand_time = now
+
+        if n_hands:
+            self._last_hand_time = now
+            self._hand_frames += 1
+        else:
+            self._hand_frames = 0
+
+        if self.mode == self.ACTIVE and now - self._last_hand_time > self.idle_after:
+            self._set_mode(self.IDLE, self.idle_model_complexity)
+        elif self.mode == self.IDLE and self._hand_frames >= self.wake_frames:
+            self._set_mode(self.ACTIVE, self.active_model_complexity)
+
+    def _set_mode(self, mode, model_complexity):
+        self.mode = mode
+        self.switches += 1
+        self.model_complexity = model_complexity
+
+    def status(self):
+        if not self.enabled:
+            return "governor off"
+        return f"{self.mode}: {self.fps} fps, model {self.model_complexity}"
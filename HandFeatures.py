@@ -0,0 +1,62 @@
+import itertools
+
+import numpy as np
+
+# Landmark chains wrist -> fingertip, one row per finger (thumb..pinky)
+CHAINS = np.array([
+    [0, 1, 2, 3, 4],
+    [0, 5, 6, 7, 8],
+    [0, 9, 10, 11, 12],
+    [0, 13, 14, 15, 16],
+    [0, 17, 18, 19, 20],
+])
+TIPS = CHAINS[:, -1]
+PAIRS = np.array(list(itertools.combinations(range(5), 2))) # (10, 2) finger indices
+
+# Finger state thresholds, radians: a finger is up when its middle joint is nearly straight
+FINGER_STRAIGHT = np.radians(150)
+THUMB_STRAIGHT = np.radians(140)
+
+
+class HandFeatures:
+    # Per-frame features of all hands, computed in one vectorized pass:
+    #   palm_size (hands,) - wrist to middle finger base, the unit for distances
+    #   tip_distances (hands, 5, 5) - all fingertip distances in palm sizes
+    #   angles (hands, 5, 3) - joint angles of every finger (pi is straight), base to tip
+    #   fingers (hands, 5) uint8 - finger up states from the angles, independent of hand rotation
+    __slots__ = ("palm_size", "tip_distances", "angles", "fingers")
+
+    def __init__(self, landmarks):
+        landmarks = np.asarray(landmarks, np.float32)
+        wrist = landmarks[:, 0]
+
+        self.palm_size = np.maximum(np.linalg.norm(landmarks[:, 9] - wrist, axis=-1), 1e-6)
+
+        tips = landmarks[:, TIPS]
+        self.tip_distances = np.linalg.norm(tips[:, :, None] - tips[:, None], axis=-1) / self.palm_size[:, None, None]
+
+        # Angle at every joint between the bone before and the bone after it
+        points = landmarks[:, CHAINS] # (hands, 5, 5, 3)
+        before = points[:, :, :-2] - points[:, :, 1:-1]
+        after = points[:, :, 2:] - points[:, :, 1:-1]
+        cos = (before * after).sum(-1) / np.maximum(
+            np.linalg.norm(before, axis=-1) * np.linalg.norm(after, axis=-1), 1e-12)
+        self.angles = np.arccos(np.clip(cos, -1.0, 1.0))
+
+        # Up: straight middle joint and the tip further from the wrist than that joint.
+        # Thumb: straight IP joint and the tip away from the pinky base
+        tip_reach = np.linalg.norm(tips - wrist[:, None], axis=-1)
+        joint_reach = np.linalg.norm(landmarks[:, CHAINS[:, 2]] - wrist[:, None], axis=-1)
+        self.fingers = ((self.angles[:, :, 1] > FINGER_STRAIGHT) & (tip_reach > joint_reach)).astype(np.uint8)
+
+        thumb_out = np.linalg.norm(landmarks[:, 4] - landmarks[:, 17], axis=-1) > \
+            np.linalg.norm(landmarks[:, 2] - landmarks[:, 17], axis=-1)
+        self.fingers[:, 0] = (self.angles[:, 0, 2] > THUMB_STRAIGHT) & thumb_out
+
+    # Distances of the 10 fingertip pairs in PAIRS order, (hands, 10)
+    def pair_distances(self):
+        return self.tip_distances[:, PAIRS[:, 0], PAIRS[:, 1]]
+
+    # Hands whose two fingertips are closer than threshold palm sizes, (hands,) bool
+    def pinched(self, finger_a, finger_b, threshold):
+        return self.tip_distances[:, finger_a, finger_b] < threshold
@@ -0,0 +1,110 @@
+import numpy as np
+
+from GestureTable import fingers_to_codes
+from HandFeatures import HandFeatures
+
+PALM_IDS = [0, 5, 9, 13, 17] # Wrist and finger bases
+
+
+class HandBatch:
+    # All hands of one frame. HandFeatures runs once for the whole batch, on first access
+    __slots__ = ("landmarks", "labels", "scores", "timestamp", "_features", "_codes")
+
+    def __init__(self, landmarks, labels, scores, timestamp):
+        self.landmarks = landmarks # (hands, 21, 3) pixels
+        self.labels = labels
+        self.scores = scores
+        self.timestamp = timestamp
+        self._features = None
+        self._codes = None
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = HandFeatures(self.landmarks)
+        return self._features
+
+    # Gesture table keys of all hands
+    @property
+    def codes(self):
+        if self._codes is None:
+            self._codes = fingers_to_codes(self.features.fingers).tolist()
+        return self._codes
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self):
+        return (HandFrame(self, i) for i in range(len(self.labels)))
+
+
+class HandFrame:
+    # One hand in one frame. Derived values are computed on first access and cached,
+    # so handlers and the overlay can ask for them as often as they like
+    __slots__ = ("landmarks", "label", "score", "timestamp", "_batch", "_index",
+                 "_fingers", "_bbox", "_palm_centre", "_distances")
+
+    def __init__(self, batch, index):
+        self.landmarks = batch.landmarks[index] # (21, 3) view, not a copy
+        self.label = batch.labels[index]
+        self.score = float(batch.scores[index])
+        self.timestamp = batch.timestamp
+        self._batch = batch
+        self._index = index
+        self._fingers = None
+        self._bbox = None
+        self._palm_centre = None
+        self._distances = {}
+
+    # Builds a one-hand batch, for callers that have a single hand's landmarks
+    @classmethod
+    def single(cls, landmarks, label="", score=1.0, timestamp=0.0):
+        landmarks = np.asarray(landmarks, np.float32)[None]
+        return cls(HandBatch(landmarks, [label], np.array([score], np.float32), timestamp), 0)
+
+    @property
+    def features(self):
+        return self._batch.features
+
+    # (5,) uint8, thumb..pinky
+    @property
+    def fingers(self):
+        if self._fingers is None:
+            self._fingers = self._batch.features.fingers[self._index]
+        return self._fingers
+
+    # Gesture table key of the finger states
+    @property
+    def code(self):
+        return self._batch.codes[self._index]
+
+    # (x1, y1, x2, y2) pixels
+    @property
+    def bbox(self):
+        if self._bbox is None:
+            x1, y1 = self.landmarks[:, :2].min(axis=0)
+            x2, y2 = self.landmarks[:, :2].max(axis=0)
+            self._bbox = (int(x1), int(y1), int(x2), int(y2))
+        return self._bbox
+
+    # (x, y) pixels, mean of the wrist and finger bases: follows the hand, not the fingers
+    @property
+    def palm_centre(self):
+        if self._palm_centre is None:
+            x, y = self.landmarks[PALM_IDS, :2].mean(axis=0)
+            self._palm_centre = (float(x), float(y))
+        return self._palm_centre
+
+    # Pixel distance between two landmarks
+    def distance(self, p1, p2):
+        key = (p1, p2) if p1 < p2 else (p2, p1)
+        length = self._distances.get(key)
+        if length is None:
+            x1, y1 = self.landmarks[p1, :2]
+            x2, y2 = self.landmarks[p2, :2]
+            length = self._distances[key] = float(np.hypot(x2 - x1, y2 - y1))
+        return length
+
+    # Fingertip distance in palm sizes (fingers 0-4), from the batch features
+    def tip_distance(self, finger_a, finger_b):
+        return float(self._batch.features.tip_distances[self._index, finger_a, finger_b])
@@ -1,27 +1,80 @@
+import math
+import threading
 import time
 import cv2
 import HandTrakingModule as htm
+from Pipeline import Pipeline
+from Actuator import Actuator
+from MouseBackends import create_backend
+from SessionLog import SessionRecorder
+from Timing import Timings, TimingExporter
+from Governor import Governor
+from DetectorProcess import RemoteHandDetector
+from MultiCamera import open_cameras, HandFusion
+from LiveConfig import ConfigSnapshot, ConfigWatcher
+from GestureState import GestureStateMachine
+from HandFrame import HandBatch
 import numpy as np
 import json
 import os
 import subprocess
-import gc
-from pynput.mouse import Button, Controller
-from Xlib import display
+import argparse
 
 
 class HandControl:
-    def __init__(self, w_cam=640, h_cam=360, config_file="config.json"):
+    CLICK_ACTIONS = ("left_one_click", "left_double_click", "right_click") # Repeat while held
+    SCROLL_ACTIONS = ("scroll_up", "scroll_down")
+
+    # mouse replaces the output backend from the config (benchmarks and replays pass a
+    # RecordingBackend), screen_size the backend's screen size,
+    # config replaces reading config_file (replays use the recorded config)
+    def __init__(self, w_cam=640, h_cam=360, config_file="config.json", screen_size=None, mouse=None,
+                 config=None, timings=None, draw=True):
         self.w_cam, self.h_cam = w_cam, h_cam
-
-        screen = display.Display().screen()
-        self.w_screen, self.h_screen = screen.width_in_pixels, screen.height_in_pixels
-
-        self.config = self._load_config(config_file)
-
-        self.smoothening = self.config["settings"]["smoothening"]
-        self.adapter_for_cam = self.config["settings"]["adapter_for_cam"]
-        self.delay_button_max = self.config["settings"]["click_delay"]
+        self.draw = draw # False: headless, no overlay drawing at all
+
+        self.timings = timings if timings is not None else Timings() # Per-stage spans
+
+        if config is None:
+            config = self._load_config(config_file)
+        # Validate before the backend and the actuator thread exist, a bad config leaves nothing open
+        snapshot = self._compile_config(config)
+
+        # "cameras" settings: capture sources, one detector each, and how their hands are fused
+        camera_config = snapshot.config["settings"].get("cameras", {})
+        self.camera_sources = camera_config.get("sources", [0])
+        self.fusion = HandFusion(camera_config.get("fusion", "select"), camera_config.get("switch_margin", 0.1),
+                                 camera_config.get("min_hold", 0.5))
+        self.fusion_max_age = camera_config.get("max_age", 0.1) # Older results of other cameras are ignored
+
+        # "output" settings: mouse backend (see MouseBackends), it knows the screen size
+        if mouse is None:
+            mouse = create_backend(config["settings"].get("output"), screen_size)
+        self.mouse = mouse
+        self.w_screen, self.h_screen = screen_size or mouse.screen_size
+        # Mouse output thread, also emits continuous scrolling (fractional if the backend can)
+        # and glides the cursor between vision updates
+        self.actuator = Actuator(self.mouse, timings=self.timings,
+                                 smooth_scroll=getattr(mouse, "smooth_scroll", False))
+        self.actuator.start()
+
+        # Gestures and tunables come from a precompiled snapshot that can be replaced
+        # while running (publish_config / watch_config)
+        self.config_file = config_file
+        self.snapshot = None
+        self.cursor_filter = None
+        self.cursor_predictor = None
+        self._pending_config = None
+        self._config_lock = threading.Lock()
+        self.config_watcher = None
+        # Time-based debouncing per hand, timings come with the config
+        self.right_state = GestureStateMachine()
+        self.left_state = GestureStateMachine()
+        # Continuous scrolling: hand position when the gesture started and smoothed hand speed
+        self._scroll_anchor = None
+        self._scroll_prev = None
+        self._scroll_hand_velocity = 0.0
+        self._apply_config(snapshot)
 
         self.reduction_ratio = 0.3
         self.reduced_x1 = int(self.w_cam * self.reduction_ratio / 2)
@@ -29,28 +82,163 @@ class HandControl:
         self.reduced_x2 = self.w_cam - self.reduced_x1
         self.reduced_y2 = self.h_cam - self.reduced_y1
 
-        self.mouse = Controller()
-
-        # Variables for smoothing motion
-        self.p_loc_x, self.p_loc_y = 0, 0 # Previous points
-        self.c_loc_x, self.c_loc_y = 0, 0 # Current points
-
-        self.right_button_is_pressed = False
-        self.left_button_is_pressed = False
-
+        self.left_button_is_pressed = False # Held by hold_and_move
 
-        self.hand_detector = htm.HandDetector(max_hands=2)
 
-        self.delay_button = 0
-
-        self.center_point = h_cam // 2
-
-        self.last_app_launch_time = 0
+        self.detectors = []
+        try:
+            for _ in self.camera_sources:
+                self.detectors.append(self._create_detector())
+            # "governor" settings: idle mode while no hand is in view
+            self.governor = Governor(self.detectors, **self.config["settings"].get("governor", {"enabled": False}))
+        except Exception:
+            # Don't leave the output thread, the backend and started detectors behind
+            self.actuator.stop()
+            if hasattr(self.mouse, "close"):
+                self.mouse.close()
+            for detector in self.detectors:
+                detector.close()
+            raise
+        self.hand_detector = self.detectors[0] # Primary camera, its frames are shown
+
+        # "timings" settings: overlay in the preview and export of histograms
+        timing_config = self.config["settings"].get("timings", {})
+        self.timing_exporter = None
+        if timing_config.get("export"):
+            self.export_timings(timing_config["export"], timing_config.get("export_interval", 1.0))
+
+        self.last_app_launch_time = float("-inf")
         self.app_launch_cooldown = 2
 
-        self.prev_img = None # Previous frame
+        self.frame_time = 0.0 # Capture time of the frame being handled
+        self.last_actions = [] # Action per hand of the last frame
+
+        self.recorder = None # SessionRecorder for field debugging
         self.frame_counter = 0
 
+    # Log every frame's landmarks and actions to a binary session file
+    def start_recording(self, path):
+        self.recorder = SessionRecorder(path, self.config, self.w_cam, self.h_cam, (self.w_screen, self.h_screen))
+
+    # Rolling span histograms to a JSON lines file or "udp://host:port"
+    def export_timings(self, target, interval=1.0):
+        if self.timing_exporter is not None:
+            self.timing_exporter.stop()
+        self.timing_exporter = TimingExporter(self.timings, target, interval)
+        self.timing_exporter.start()
+
+    # First inference of every detector ahead of the first frame
+    def warm_up(self):
+        for detector in self.detectors:
+            detector.warm_up(self.w_cam, self.h_cam)
+
+    # Forget the previous session so the instance can be reused after a stop
+    def reset(self):
+        if self.left_button_is_pressed:
+            self.actuator.release("left")
+        self.left_button_is_pressed = False
+        self.right_state.reset()
+        self.left_state.reset()
+        self._stop_scroll()
+        self.actuator.stop_cursor()
+        self.cursor_filter.reset()
+        if self.cursor_predictor is not None:
+            self.cursor_predictor.reset()
+        self.governor.reset()
+        self.fusion.reset()
+        self.last_actions = []
+
+    # Validate and precompile a new config, the gesture stage swaps it in before its next frame.
+    # Raises ValueError on invalid gestures. Returns the changed settings sections
+    # that need a new controller (detectors, cameras)
+    def publish_config(self, config):
+        snapshot = self._compile_config(config)
+        with self._config_lock:
+            self._pending_config = snapshot
+        return snapshot.restart_settings(self.snapshot)
+
+    # Pick up edits of the config file while running
+    def watch_config(self, path=None, interval=1.0):
+        def publish(config):
+            restart = self.publish_config(config)
+            print("Конфиг обновлён")
+            if restart:
+                print(f"Изменения {', '.join(restart)} применятся после перезапуска")
+
+        self.config_watcher = ConfigWatcher(path or self.config_file, publish, interval)
+        self.config_watcher.start()
+
+    def _compile_config(self, config):
+        return ConfigSnapshot(config, lambda action: getattr(self, f"_gesture_{action}"))
+
+    # Runs between frames in the gesture stage (or at construction). Everything that can fail
+    # was built with the snapshot, the swap itself doesn't raise
+    def _apply_config(self, snapshot):
+        previous = self.snapshot
+        self.config = snapshot.config
+        if previous is not None and self.recorder is not None and snapshot.config != previous.config:
+            self.recorder.new_segment(snapshot.config) # A replay needs the config of every frame
+
+        if previous is None or snapshot.conflicts != previous.conflicts:
+            for conflict in snapshot.conflicts:
+                print(f"Конфликт жестов: {conflict}")
+
+        self.right_action_names = snapshot.right_action_names
+        self.right_actions = snapshot.right_actions
+        self.pinches = snapshot.pinches
+        self.left_apps = snapshot.left_apps
+        self.adapter_for_cam = snapshot.adapter_for_cam
+
+        # Timings change in place, a held gesture stays held
+        timing = snapshot.gesture_timing
+        for state in (self.right_state, self.left_state):
+            state.enter, state.exit = timing["gesture_enter"], timing["gesture_exit"]
+        self.right_state.repeat = {action: timing["click_repeat"] for action in self.CLICK_ACTIONS}
+
+        self.scroll_settings = snapshot.scroll
+        self.actuator.scroll_period = 1.0 / snapshot.scroll["rate_hz"]
+        if previous is None or snapshot.cursor_rate != previous.cursor_rate:
+            self.actuator.set_cursor_rate(snapshot.cursor_rate)
+
+        # A new filter only when its settings change, so the cursor doesn't jump
+        if previous is None or snapshot.cursor_filter != previous.cursor_filter:
+            self.cursor_filter = snapshot.filter
+        if previous is None or snapshot.cursor_prediction != previous.cursor_prediction:
+            self.cursor_predictor = snapshot.predictor
+        # Keep an overlay switched on from the command line or the GUI
+        if previous is None or snapshot.show_timings != previous.show_timings:
+            self.show_timings = snapshot.show_timings
+
+        self.snapshot = snapshot
+
+    # Stop the mouse output thread and the detectors, finish the session log
+    def close(self):
+        if self.left_button_is_pressed: # Don't leave the button held after exit
+            self.actuator.release("left")
+            self.left_button_is_pressed = False
+        self.actuator.stop()
+        if hasattr(self.mouse, "close"):
+            self.mouse.close()
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+            self.config_watcher = None
+        for detector in self.detectors:
+            detector.close()
+        if self.timing_exporter is not None:
+            self.timing_exporter.stop()
+            self.timing_exporter = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    # "inference" settings: ROI tracking, adaptive resolution and
+    # "worker_process" - MediaPipe in a separate process with frames in shared memory
+    def _create_detector(self):
+        inference = dict(self.config["settings"].get("inference", {}))
+        if inference.pop("worker_process", False):
+            return RemoteHandDetector(self.w_cam, self.h_cam, max_hands=2, timings=self.timings, **inference)
+        return htm.HandDetector(max_hands=2, timings=self.timings, **inference)
+
     def _load_config(self, config_file):
         if not os.path.exists(config_file):
             raise FileNotFoundError(f"Config file {config_file} not found")
@@ -59,19 +247,6 @@ class HandControl:
             config = json.load(f)
         return config
 
-    # Comparing fingers with patterns
-    def _check_gesture(self, fingers, hand_type, gesture_name):
-        try:
-            gesture = self.config["gestures"][hand_type][gesture_name]
-
-            if "fingers_up" in gesture:
-                if fingers == gesture["fingers_up"]:
-                    return True
-
-        except KeyError:
-            print(f"Жест {gesture_name} не найден для {hand_type}")
-            return False
-
     def _launch_application(self, command):
         try:
             subprocess.Popen(command.split(), shell=True)
@@ -81,96 +256,146 @@ class HandControl:
             print(f"Ошибка запуска: {e}")
             return False
 
-    # Delay between gestures
-    def _delay(self):
-        self.delay_button += 1
-        if self.delay_button > self.delay_button_max:
-            self.delay_button = 0
-            self.left_button_is_pressed = False
-            self.right_button_is_pressed = False
-
-    def _right_hand(self, img, landmarks_list):
-        if not landmarks_list:
-            return img
-
-        fingers = self.hand_detector.fingers_up(landmarks_list)
-        hand_type = "right_hand"
-
-        if self._check_gesture(fingers, hand_type, "move_mouse"):
-            x1, y1 = landmarks_list[8][1], landmarks_list[8][2]
-            self._move_mouse(x1, y1)
-            cv2.putText(img, "MOVE", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-
-        elif self._check_gesture(fingers, hand_type, "left_one_click"):
-            if not self.left_button_is_pressed and self.delay_button == 0:
-                self.mouse.click(Button.left, 1)
-                self.left_button_is_pressed = True
-            else:
-                self._delay()
-            cv2.putText(img, "LEFT CLICK", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-
-        elif self._check_gesture(fingers, hand_type, "left_double_click"):
-            if not self.left_button_is_pressed and self.delay_button == 0:
-                self.mouse.click(Button.left, 2)
-                self.left_button_is_pressed = True
-            else:
-                self._delay()
-            cv2.putText(img, "DOUBLE CLICK", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-
-        elif self._check_gesture(fingers, hand_type, "right_click"):
-            if not self.right_button_is_pressed and self.delay_button == 0:
-                self.mouse.click(Button.right, 1)
-                self.right_button_is_pressed = True
-            else:
-                self._delay()
-            cv2.putText(img, "RIGHT CLICK", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-
-        elif self._check_gesture(fingers, hand_type, "scroll_up"):
-            self.mouse.scroll(0, 1)
-            cv2.putText(img, "SCROLL UP", (50, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-            time.sleep(0.1)
-
-        elif self._check_gesture(fingers, hand_type, "scroll_down"):
-            self.mouse.scroll(0, -1)
-            cv2.putText(img, "SCROLL DOWN", (50, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 255), 2)
-            time.sleep(0.1)
-
-        elif self._check_gesture(fingers, hand_type, "hold_and_move"):
-            self.mouse.press(Button.left)
+    # Gesture label on the preview
+    def _label(self, img, text, org, color):
+        if self.draw:
+            cv2.putText(img, text, org, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+
+    # Right hand actions, bound by name from the gesture table. Called every frame
+    # while the gesture is active with the HandFrame and event "press" (first frame), "repeat" or "hold"
+    def _gesture_move_mouse(self, img, hand, event):
+        x1, y1 = hand.landmarks[8, 0], hand.landmarks[8, 1]
+        self._move_mouse(x1, y1)
+        self._label(img, "MOVE", (50, 50), (255, 0, 0))
+
+    def _gesture_left_one_click(self, img, hand, event):
+        if event != "hold":
+            self.actuator.click("left", 1)
+        self._label(img, "LEFT CLICK", (50, 50), (255, 0, 0))
+
+    def _gesture_left_double_click(self, img, hand, event):
+        if event != "hold":
+            self.actuator.click("left", 2)
+        self._label(img, "DOUBLE CLICK", (50, 50), (255, 0, 0))
+
+    def _gesture_right_click(self, img, hand, event):
+        if event != "hold":
+            self.actuator.click("right", 1)
+        self._label(img, "RIGHT CLICK", (50, 50), (255, 0, 0))
+
+    # The actuator scrolls at a steady rate, the vision loop only updates the speed.
+    # direction: 1 - up, -1 - down
+    def _scroll(self, hand, direction):
+        settings = self.scroll_settings
+        y = float(hand.landmarks[9, 1]) # Base of the middle finger: moves with the hand, not with the fingers
+
+        if self._scroll_anchor is None:
+            self._scroll_anchor = y
+            self._scroll_prev = (y, self.frame_time)
+            self._scroll_hand_velocity = 0.0
+
+        def beyond_dead_zone(value):
+            return max(0.0, abs(value) - settings["dead_zone"]) * (1 if value > 0 else -1)
+
+        if settings["mode"] == "velocity":
+            # Follows the hand like dragging the page, direction from the motion
+            prev_y, prev_t = self._scroll_prev
+            dt = self.frame_time - prev_t
+            if dt > 0:
+                alpha = 1 - math.exp(-dt / 0.1)
+                self._scroll_hand_velocity += alpha * ((prev_y - y) / dt - self._scroll_hand_velocity)
+            self._scroll_prev = (y, self.frame_time)
+            speed = settings["gain"] * beyond_dead_zone(self._scroll_hand_velocity)
+        else:
+            # Base speed in the gesture's direction, faster the further the hand moves that way
+            offset = (self._scroll_anchor - y) * direction # Image y grows downwards
+            speed = direction * max(0.0, settings["speed"] + settings["gain"] * beyond_dead_zone(offset))
+
+        speed = max(-settings["max_speed"], min(settings["max_speed"], speed))
+        self.actuator.set_scroll_velocity(0, speed)
+
+    def _stop_scroll(self):
+        if self._scroll_anchor is not None:
+            self.actuator.set_scroll_velocity(0, 0)
+            self._scroll_anchor = None
+
+    def _gesture_scroll_up(self, img, hand, event):
+        self._scroll(hand, 1)
+        self._label(img, "SCROLL UP", (50, 80), (0, 255, 255))
+
+    def _gesture_scroll_down(self, img, hand, event):
+        self._scroll(hand, -1)
+        self._label(img, "SCROLL DOWN", (50, 80), (255, 0, 255))
+
+    def _gesture_hold_and_move(self, img, hand, event):
+        if event == "press":
+            self.actuator.press("left")
             self.left_button_is_pressed = True
-            cv2.putText(img, "HOLD", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+        self._label(img, "HOLD", (50, 50), (255, 255, 0))
 
-        elif self._check_gesture(fingers, hand_type, "release"):
-            self.mouse.release(Button.left)
+    def _gesture_release(self, img, hand, event):
+        if event == "press":
+            self.actuator.release("left")
             self.left_button_is_pressed = False
-            cv2.putText(img, "RELEASE", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-
-        return img
-
-
-    def _left_hand(self, img, landmarks_list):
+        self._label(img, "RELEASE", (50, 50), (0, 255, 255))
+
+    # Right hand action of every hand: pinch gestures first, then the finger code table
+    def _classify_right(self, hands):
+        features = hands.features
+        actions = [self.right_action_names.get(code, "") for code in hands.codes]
+
+        pinched = set()
+        for action, finger_a, finger_b, threshold, wanted in self.pinches:
+            matched = features.pinched(finger_a, finger_b, threshold) & (features.fingers == wanted).all(axis=1)
+            for i in np.flatnonzero(matched).tolist():
+                if i not in pinched: # The first matching pinch gesture in config order wins
+                    actions[i] = action
+                    pinched.add(i)
+        return actions
+
+    # Recognized action -> debounced action -> handler, returns the active action name ("" if none)
+    def _right_hand(self, img, hand, recognized):
+        events = self.right_state.update(recognized, self.frame_time)
+        action = self.right_state.active
+        if not action:
+            return ""
+
+        event = "hold"
+        for name, event_action in events:
+            if event_action == action and name != "release":
+                event = name
+        # Another gesture is forming while this one runs out: keep the cursor still, so a click
+        # that follows a move lands where the move stopped
+        if event == "hold" and recognized != action:
+            return action
+        self.right_actions[action](img, hand, event)
+        return action
+
+
+    def _left_hand(self, img, hand):
+        action = ""
         try:
-            if not landmarks_list:
-                return img
-
-            fingers = self.hand_detector.fingers_up(landmarks_list)
-            current_time = time.time()
-
-            for id, cx, cy in landmarks_list[:21]:
-                cv2.circle(img, (cx, cy), 7, (0, 0, 255), cv2.FILLED)
-
-            if current_time - self.last_app_launch_time > self.app_launch_cooldown:
-                for app_name, gesture_config in self.config["gestures"]["left_hand"]["app_launch"]["gestures"].items():
-                    if fingers == gesture_config["fingers_up"]:
-                        if self._launch_application(gesture_config["command"]):
-                            cv2.putText(img, f"Launching {app_name}", (50, 80),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        self.last_app_launch_time = current_time
-                        break
+            current_time = self.frame_time
+
+            if self.draw:
+                with self.timings.span("overlay"):
+                    for cx, cy in hand.landmarks[:, :2].astype(np.int32).tolist():
+                        cv2.circle(img, (cx, cy), 7, (0, 0, 255), cv2.FILLED)
+
+            # Launch once per debounced press of an app gesture
+            app = self.left_apps.get(hand.code)
+            app_name = app[0] if app else ""
+            events = self.left_state.update(app_name, current_time)
+            if ("press", app_name) in events and current_time - self.last_app_launch_time > self.app_launch_cooldown:
+                command = app[1]
+                if self._launch_application(command):
+                    self._label(img, f"Launching {app_name}", (50, 80), (0, 255, 0))
+                self.last_app_launch_time = current_time
+                action = f"launch:{app_name}"
 
         except Exception as e:
             print(f"Ошибка обработки левой руки: {e}")
-        return img
+        return action
 
 
     def _move_mouse(self, x1, y1):
@@ -182,45 +407,22 @@ class HandControl:
         ), (0, self.h_screen))
 
         # Smoothening
-        self.c_loc_x = self.p_loc_x + (x3 - self.p_loc_x) / self.smoothening
-        self.c_loc_y = self.p_loc_y + (y3 - self.p_loc_y) / self.smoothening
+        x, y = self.cursor_filter((x3, y3), self.frame_time)
 
-        # Setup mouse position
-        self.mouse.position = [(self.w_screen - self.c_loc_x), self.c_loc_y]
+        # Lead the finger by the time the frame took to reach the cursor
+        if self.cursor_predictor is not None:
+            x, y = self.cursor_predictor((x, y), self.frame_time, self.actuator.latency)
+            x, y = min(max(x, 0), self.w_screen), min(max(y, 0), self.h_screen)
 
-        self.p_loc_x, self.p_loc_y = self.c_loc_x, self.c_loc_y
+        # Setup mouse position
+        self.actuator.move(self.w_screen - x, y, captured=self.frame_time)
 
     def _process_frame(self, img):
         try:
-            if hasattr(self, 'prev_img'):
-                del self.prev_img
-            self.prev_img = img.copy()
-
-            # Garbage collection
             self.frame_counter += 1
-            if self.frame_counter % 30 == 0:
-                gc.collect()
-
-            img = self.hand_detector.find_hands(img) # Detection hands
-            hands_data = self.hand_detector.find_position(img, draw=False) # Capture hands
-
-            for hand in hands_data:
-                landmarks = hand["landmarks"]
-                hand_label = hand["label"]
-
-                # Inversion of hands due to camera mirroring
-                if hand_label == "left":
-                    self._right_hand(img, landmarks)
-                elif hand_label == "right":
-                    self._left_hand(img, landmarks)
-
-            # Gesture capture area
-            cv2.rectangle(
-                img,
-                (self.reduced_x1, self.reduced_y1),
-                (self.reduced_x2, self.reduced_y2),
-                (0, 255, 0), 2
-            )
+
+            hands_data = self._detect(img)
+            img = self._handle_hands(img, hands_data)
 
             return img
 
@@ -228,36 +430,140 @@ class HandControl:
             print(f"Ошибка обработки кадра: {e}")
             return img
 
+    # Inference stage of the primary camera
+    def _detect(self, img):
+        return self._fuse([self._detect_camera(img, self.hand_detector, self.draw)])
+
+    # MediaPipe + landmarks to pixels of the primary camera's frame size
+    def _detect_camera(self, img, detector, draw=False):
+        if self.governor.enabled:
+            detector.set_model_complexity(self.governor.model_complexity) # From the camera's own thread
+        img = detector.find_hands(img, draw) # Detection hands
+        landmarks, labels, scores = detector.find_landmarks(img) # (hands, 21, 3) array, labels, scores
+
+        h, w = img.shape[:2]
+        if (w, h) != (self.w_cam, self.h_cam): # Camera ignored the requested resolution
+            landmarks[:, :, :2] *= np.array((self.w_cam / w, self.h_cam / h), np.float32)
+        return landmarks, labels, scores
+
+    # One hand per label from the results of all cameras
+    def _fuse(self, results):
+        now = time.monotonic()
+        hands_data = results[0] if len(results) == 1 else self.fusion(results, now)
+
+        self.governor.update(len(hands_data[1]), now)
+        return hands_data
+
+    # Gesture stage: classification, mouse actions and overlay
+    def _handle_hands(self, img, hands_data, timestamp=None):
+        landmarks, labels, scores = hands_data
+
+        # Published config: swapped as a whole, no frame sees a mix of old and new settings
+        if self._pending_config is not None:
+            with self._config_lock:
+                snapshot, self._pending_config = self._pending_config, None
+            self._apply_config(snapshot)
+
+        self.frame_time = timestamp if timestamp is not None else time.monotonic()
+
+        # Features, finger states and gestures for all hands in one pass
+        with self.timings.span("classify"):
+            hands = HandBatch(landmarks, labels, scores, self.frame_time)
+            right_actions = self._classify_right(hands)
+
+        actions = []
+        for hand, right_action in zip(hands, right_actions):
+            # Inversion of hands due to camera mirroring
+            if hand.label == "left":
+                actions.append(self._right_hand(img, hand, right_action))
+            elif hand.label == "right":
+                actions.append(self._left_hand(img, hand))
+            else:
+                actions.append("")
+        self.last_actions = actions
+
+        # A hand out of view counts as no gesture, so its state can run out
+        if "left" not in labels:
+            self.right_state.update("", self.frame_time)
+        if "right" not in labels:
+            self.left_state.update("", self.frame_time)
+
+        if self.right_state.active not in self.SCROLL_ACTIONS:
+            self._stop_scroll()
+
+        if self.recorder is not None:
+            self.recorder.write(self.frame_time, landmarks, labels, scores, hands.features.fingers, actions)
+
+        # Gesture capture area and governor mode
+        if self.draw:
+            with self.timings.span("overlay"):
+                cv2.rectangle(
+                    img,
+                    (self.reduced_x1, self.reduced_y1),
+                    (self.reduced_x2, self.reduced_y2),
+                    (0, 255, 0), 2
+                )
+                if self.governor.enabled:
+                    cv2.putText(img, self.governor.status(), (10, self.h_cam - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
 
+        return img
 
-def main():
-    w_cam, h_cam = 640, 360
-    cap = cv2.VideoCapture(0)
-    cap.set(3, w_cam)
-    cap.set(4, h_cam)
-
-    hand_contol = HandControl(w_cam, h_cam)
-
-    while True:
-        success, img = cap.read()
-        if not success:
-            break
 
-        img = hand_contol._process_frame(img)
 
+def main():
+    parser = argparse.ArgumentParser(description="Hand Control")
+    parser.add_argument("--record", help="write the session to this binary log, overwriting it. "
+                             "A config change continues in NAME.1.hclog, ... (see SessionLog.py)")
+    parser.add_argument("--timings", action="store_true", help="show per-stage timings in the window")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window and no overlay drawing: capture, inference and mouse only")
+    parser.add_argument("--export-timings", help="JSON lines file or udp://host:port for timing histograms")
+    args = parser.parse_args()
 
+    w_cam, h_cam = 640, 360
+    hand_contol = HandControl(w_cam, h_cam, draw=not args.headless)
+    caps = open_cameras(hand_contol.camera_sources, w_cam, h_cam)
+    if args.record:
+        hand_contol.start_recording(args.record)
+    if args.timings:
+        hand_contol.show_timings = True
+    if args.export_timings:
+        hand_contol.export_timings(args.export_timings)
+    hand_contol.watch_config() # Edits of config.json apply without a restart
+
+    # Capture, detection and gestures run in their own threads,
+    # display stays in the main thread for cv2.imshow
+    pipeline = Pipeline(caps, hand_contol)
+    pipeline.start()
+
+    def show(packet):
+        img = packet.img
         cv2.putText(img, "Left: Apps | Right: Mouse", (10, 60),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-
+        if hand_contol.show_timings:
+            hand_contol.timings.draw(img)
 
         cv2.imshow("Hand Control", img)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    try:
+        # Headless: stop with Ctrl+C, the report shows cpu ms/frame to compare with the windowed mode
+        pipeline.run_display(None if args.headless else show, report_interval=5.0)
+    except KeyboardInterrupt:
+        pipeline.stop()
+    print(pipeline.report())
+    print(hand_contol.actuator.report())
+    if hasattr(hand_contol.mouse, "report"):
+        print(hand_contol.mouse.report())
+    hand_contol.close()
 
     # Freeing up resources
-    cap.release()
-    cv2.destroyAllWindows()
+    for cap in caps:
+        cap.release()
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,11 +1,19 @@
 import cv2
 import mediapipe as mp
-import math
+import numpy as np
+import time
+
+from FramePool import ensure_buffer
+from HandFrame import HandBatch
+from Timing import Timings
 
 
 class HandDetector:
     def __init__(self, mode = False, max_hands = 2, model_complexity=1,
-                 detection_con = 0.5, track_con = 0.5):
+                 detection_con = 0.5, track_con = 0.5,
+                 roi_tracking=False, roi_padding=0.35, full_frame_interval=30,
+                 adaptive_resolution=False, target_fps=30, min_scale=0.5,
+                 keyframe_interval=1, keyframe_speed=0.05, flow_min_tracked=0.8, timings=None):
         # Settings for mediapipe
         self.mode = mode # Setup stream
         self.max_hands = max_hands
@@ -22,6 +30,8 @@ class HandDetector:
             self.detection_con,
             self.track_con)
 
+        self._models = {self.model_complexity: self.hands} # Loaded models by complexity
+
         self.mp_draw = mp.solutions.drawing_utils # Visualization of bones
 
         self.tip_ids = [4, 8, 12, 16, 20] # Fingertips
@@ -31,77 +41,289 @@ class HandDetector:
         # 16 - ring
         # 20 - pinky
 
-        self.lm_list = [] # List of landmarks
+        self.hand_frames = [] # HandFrame of every hand from the last find_position
 
         self.results = None # Frame to process
 
+        self._img_rgb = None # Reused RGB buffer for Mediapipe
+        self._img_scaled = None # Reused buffer for reduced resolution
+
+        # Tracking mode: run inference only on a crop around the hand
+        self.roi_tracking = roi_tracking
+        self.roi_padding = roi_padding # Padding around the hand, share of its size
+        self.full_frame_interval = full_frame_interval # Frames between full-frame checks for new hands
+        self.roi_box = None # (x, y, w, h) of the image the last results refer to
+        self._roi = None # Crop for the next frame, None - full frame
+        self._prev_center = None
+        self._roi_frames = 0
+
+        # Lower inference resolution when the CPU can't keep up
+        self.adaptive_resolution = adaptive_resolution
+        self.frame_budget = 1.0 / target_fps
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self._avg_time = None
+
+        # Keyframe mode: full inference every few frames, the landmarks follow the hand
+        # by sparse optical flow in between. The interval shrinks as the hand moves faster
+        self.keyframe_interval = keyframe_interval # Max frames per inference, 1 - infer every frame
+        self.keyframe_speed = keyframe_speed # Hand speed (hand sizes per frame) that halves the interval
+        self.flow_min_tracked = flow_min_tracked # Share of landmarks flow must keep, less forces a keyframe
+        self.interval = keyframe_interval # Current interval
+        self.keyframe = True # The last find_hands ran inference
+        self._track = None # (landmarks, labels, scores) of the last frame in pixels, None - no hands
+        self._gray = None
+        self._prev_gray = None
+        self._flow_frames = 0
+        self._speed = 0.0
+
+        self.timings = timings if timings is not None else Timings() # Per-stage spans
+
+    def preload_model(self, model_complexity):
+        if model_complexity not in self._models:
+            self._models[model_complexity] = self.mp_hands.Hands(
+                self.mode,
+                self.max_hands,
+                model_complexity,
+                self.detection_con,
+                self.track_con)
+        return self._models[model_complexity]
+
+    # Switch between loaded models between frames (0 - light, 1 - full)
+    def set_model_complexity(self, model_complexity):
+        if model_complexity == self.model_complexity:
+            return
+        self.hands = self.preload_model(model_complexity)
+        self.model_complexity = model_complexity
+
+    # One inference per loaded model on a blank frame: the first call is much slower than the rest.
+    # Bypasses ROI tracking and the adaptive resolution so their state isn't disturbed
+    def warm_up(self, w, h):
+        blank = np.zeros((h, w, 3), np.uint8)
+        for hands in list(self._models.values()):
+            hands.process(blank)
+
+    def close(self):
+        for hands in self._models.values():
+            hands.close()
+
     def find_hands(self, img, draw = True):
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # Convert from BGR to RGB for Mediapipe
+        if self.keyframe_interval > 1:
+            with self.timings.span("optical_flow"):
+                self._prev_gray, self._gray = self._gray, ensure_buffer(self._prev_gray, img.shape[:2])
+                cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._gray)
+                propagated = self._flow_frames + 1 < self.interval and self._propagate()
+
+            self.keyframe = not propagated
+            if propagated:
+                self._flow_frames += 1
+                if draw:
+                    self._draw_track(img)
+                return img
+            self._flow_frames = 0
 
-        self.results = self.hands.process(img_rgb) # Processing frame
+        start = time.perf_counter()
+        h, w = img.shape[:2]
+
+        use_roi = self.roi_tracking and self._roi is not None and self._roi_frames < self.full_frame_interval
+        self.results = self._process(img, self._roi if use_roi else (0, 0, w, h))
+
+        if use_roi:
+            self._roi_frames += 1
+            if not self.results.multi_hand_landmarks:
+                # Hand left the crop: fall back to full-frame detection
+                self.results = self._process(img, (0, 0, w, h))
+        else:
+            self._roi_frames = 0
+
+        if self.roi_tracking:
+            self._update_roi(w, h)
+        if self.adaptive_resolution:
+            self._update_scale(time.perf_counter() - start)
+        if self.keyframe_interval > 1:
+            self._set_track(self._landmarks_from_results())
 
         # Rendering hands
-        if self.results.multi_hand_landmarks:
-            for hand_lms in self.results.multi_hand_landmarks:
-                if draw:
-                    self.mp_draw.draw_landmarks(img, hand_lms, self.mp_hands.HAND_CONNECTIONS)
+        if self.results.multi_hand_landmarks and draw:
+            with self.timings.span("overlay"):
+                x0, y0, bw, bh = self.roi_box
+                view = img[y0:y0 + bh, x0:x0 + bw] # Landmarks are relative to the processed crop
+                for hand_lms in self.results.multi_hand_landmarks:
+                    self.mp_draw.draw_landmarks(view, hand_lms, self.mp_hands.HAND_CONNECTIONS)
 
         return img
 
-    def find_position(self, img, draw=True):
-        hands_data = []
-
-        if self.results.multi_hand_landmarks and self.results.multi_handedness:
-            # Iterating over detected hands
-            for hand_landmarks, handedness in zip(self.results.multi_hand_landmarks,
-                                                  self.results.multi_handedness):
-                hand_info = {
-                    "landmarks": [],
-                    "label": handedness.classification[0].label.lower()  # Determining the type of hand
-                                                                        # (left or right)
-                }
-
-                # Convert from coordinates to pixels
-                for id, lm in enumerate(hand_landmarks.landmark):
-                    h, w, _ = img.shape
-                    cx, cy = int(lm.x * w), int(lm.y * h)
-                    hand_info["landmarks"].append([id, cx, cy])
-
-                    if draw:
-                        cv2.circle(img, (cx, cy), 7, (255, 0, 0), cv2.FILLED)
-                hands_data.append(hand_info)
-
-        return hands_data
-
-    def fingers_up(self, landmarks=None):
-        if landmarks is None:
-            if not hasattr(self, 'lm_list') or not self.lm_list:
-                return []
-            landmarks = self.lm_list
-
-        fingers = []
-
-        # for thumb
-        if landmarks[self.tip_ids[0]][1] > landmarks[self.tip_ids[0] - 1][1]:
-            fingers.append(1) # Finger is up
+    # Inference on a part of the frame, optionally at reduced resolution
+    def _process(self, img, box):
+        x0, y0, bw, bh = box
+        self.roi_box = box
+        crop = img[y0:y0 + bh, x0:x0 + bw]
+
+        with self.timings.span("bgr_to_rgb"):
+            if self.scale < 1.0:
+                size = (max(1, int(bw * self.scale)), max(1, int(bh * self.scale)))
+                self._img_scaled = ensure_buffer(self._img_scaled, (size[1], size[0], 3))
+                cv2.resize(crop, size, dst=self._img_scaled, interpolation=cv2.INTER_AREA)
+                crop = self._img_scaled
+
+            # Convert from BGR to RGB for Mediapipe
+            self._img_rgb = ensure_buffer(self._img_rgb, crop.shape)
+            cv2.cvtColor(crop, cv2.COLOR_BGR2RGB, dst=self._img_rgb)
+
+        with self.timings.span("hands.process"):
+            return self.hands.process(self._img_rgb) # Processing frame
+
+    # Moves the last landmarks along the optical flow. False when too many of them are lost:
+    # the hand turned, got occluded or left the frame, so it needs a keyframe
+    def _propagate(self):
+        if self._track is None or self._prev_gray is None or self._prev_gray.shape != self._gray.shape:
+            return False
+
+        landmarks, labels, scores = self._track
+        points = np.ascontiguousarray(landmarks[:, :, :2].reshape(-1, 1, 2))
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, self._gray, points, None,
+                                                     winSize=(15, 15), maxLevel=2)
+        status = status.reshape(len(labels), 21).astype(bool)
+        if (status.mean(axis=1) < self.flow_min_tracked).any():
+            return False
+
+        # Lost points move with the rest of their hand
+        shift = moved.reshape(len(labels), 21, 2) - landmarks[:, :, :2]
+        for hand, tracked in enumerate(status):
+            shift[hand, ~tracked] = np.median(shift[hand, tracked], axis=0)
+
+        propagated = landmarks.copy()
+        propagated[:, :, :2] += shift
+        self._set_track((propagated, labels, scores))
+        return True
+
+    # New landmarks of the track, updates the hand speed and the keyframe interval
+    def _set_track(self, track):
+        landmarks = track[0]
+        if self._track is not None and 0 < len(landmarks) == len(self._track[0]):
+            size = np.maximum(np.ptp(landmarks[:, :, :2], axis=1).max(axis=1), 1.0)
+            step = np.linalg.norm(landmarks[:, :, :2] - self._track[0][:, :, :2], axis=-1).mean(axis=1)
+            self._speed = 0.5 * self._speed + 0.5 * float((step / size).max())
+
+        self._track = track if len(landmarks) else None # No hands: infer every frame to find new ones
+        self.interval = max(1, int(self.keyframe_interval / (1 + self._speed / self.keyframe_speed)))
+
+    def _draw_track(self, img):
+        with self.timings.span("overlay"):
+            for hand in self._track[0][:, :, :2].astype(np.int32).tolist():
+                for a, b in self.mp_hands.HAND_CONNECTIONS:
+                    cv2.line(img, hand[a], hand[b], (255, 255, 255), 2)
+                for cx, cy in hand:
+                    cv2.circle(img, (cx, cy), 4, (0, 0, 255), cv2.FILLED)
+
+    # Predict the crop for the next frame from the current landmarks
+    def _update_roi(self, w, h):
+        if not self.results.multi_hand_landmarks:
+            self._roi = None
+            self._prev_center = None
+            return
+
+        x0, y0, bw, bh = self.roi_box
+        points = np.array([[lm.x, lm.y] for hand_landmarks in self.results.multi_hand_landmarks
+                           for lm in hand_landmarks.landmark], np.float32)
+        points = points * (bw, bh) + (x0, y0)
+
+        (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+        center = np.array(((min_x + max_x) / 2, (min_y + max_y) / 2))
+
+        # Shift by the last motion so a moving hand stays inside the crop
+        if self._prev_center is not None:
+            shift = center - self._prev_center
+            min_x, max_x = min_x + shift[0], max_x + shift[0]
+            min_y, max_y = min_y + shift[1], max_y + shift[1]
+        self._prev_center = center
+
+        pad = self.roi_padding * max(max_x - min_x, max_y - min_y)
+        x1, y1 = int(max(0, min_x - pad)), int(max(0, min_y - pad))
+        x2, y2 = int(min(w, max_x + pad)), int(min(h, max_y + pad))
+
+        # Keep the crop while the hand stays inside it: Mediapipe tracks in crop coordinates
+        if self._roi is not None:
+            rx, ry, rw, rh = self._roi
+            if rx <= x1 and ry <= y1 and x2 <= rx + rw and y2 <= ry + rh:
+                return
+
+        # A big crop saves nothing over the full frame
+        if (x2 - x1) * (y2 - y1) > 0.6 * w * h or x2 - x1 < 32 or y2 - y1 < 32:
+            self._roi = None
         else:
-            fingers.append(0) # Finger is down
+            self._roi = (x1, y1, x2 - x1, y2 - y1)
+
+    # Smoothed inference time against the frame budget
+    def _update_scale(self, duration):
+        self._avg_time = duration if self._avg_time is None else 0.9 * self._avg_time + 0.1 * duration
+
+        if self._avg_time > self.frame_budget:
+            self.scale = max(self.min_scale, self.scale * 0.9)
+        elif self._avg_time < 0.6 * self.frame_budget:
+            self.scale = min(1.0, self.scale * 1.05)
+
+    # HandFrame of every hand, in pixels of the full frame
+    def find_position(self, img, draw=True):
+        landmarks, labels, scores = self._find_landmarks()
+        self.hand_frames = list(HandBatch(landmarks, labels, scores, time.monotonic()))
+
+        if draw:
+            for cx, cy in landmarks[:, :, :2].reshape(-1, 2).astype(np.int32).tolist():
+                cv2.circle(img, (cx, cy), 7, (255, 0, 0), cv2.FILLED)
+
+        return self.hand_frames
+
+    # Array mode: (hands, 21, 3) float32 with x, y in pixels and z scaled like x,
+    # plus labels ("left"/"right") and handedness scores
+    def find_landmarks(self, img):
+        with self.timings.span("find_position"):
+            return self._find_landmarks()
+
+    def _find_landmarks(self):
+        if self.keyframe_interval > 1: # Inferred or propagated, the track is the current frame
+            if self._track is None:
+                return np.empty((0, 21, 3), np.float32), [], np.empty(0, np.float32)
+            landmarks, labels, scores = self._track
+            return landmarks.copy(), list(labels), scores.copy()
+        return self._landmarks_from_results()
+
+    def _landmarks_from_results(self):
+        if not self.results or not self.results.multi_hand_landmarks or not self.results.multi_handedness:
+            return np.empty((0, 21, 3), np.float32), [], np.empty(0, np.float32)
+
+        landmarks = np.array(
+            [[(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+             for hand_landmarks in self.results.multi_hand_landmarks],
+            dtype=np.float32
+        )
+
+        # Convert from coordinates to pixels for all hands at once
+        x0, y0, w, h = self.roi_box
+        landmarks *= np.array((w, h, w), np.float32)
+        landmarks[:, :, :2] += np.array((x0, y0), np.float32)
+
+        labels = [handedness.classification[0].label.lower()
+                  for handedness in self.results.multi_handedness]
+        scores = np.array([handedness.classification[0].score
+                           for handedness in self.results.multi_handedness], dtype=np.float32)
 
-        # for 2-5 fingers
-        for id in range(1, 5):
-            if landmarks[self.tip_ids[id]][2] < landmarks[self.tip_ids[id] - 2][2]:
-                fingers.append(1)
-            else:
-                fingers.append(0)
+        return landmarks, labels, scores
 
-        return fingers
+    # Finger states of a HandFrame, by default the first hand from find_position
+    def fingers_up(self, hand=None):
+        hand = hand or (self.hand_frames[0] if self.hand_frames else None)
+        if hand is None:
+            return []
+        return hand.fingers.tolist()
 
-    def find_distance(self, p1, p2, img, draw=True, r=15, t=3):
-        if not hasattr(self, 'lm_list') or len(self.lm_list) == 0:
+    def find_distance(self, p1, p2, img, draw=True, r=15, t=3, hand=None):
+        hand = hand or (self.hand_frames[0] if self.hand_frames else None)
+        if hand is None:
             return 0, img, [0,0,0,0,0,0]
 
-        x1, y1 = self.lm_list[p1][1], self.lm_list[p1][2]
-        x2, y2 = self.lm_list[p2][1], self.lm_list[p2][2]
+        x1, y1 = int(hand.landmarks[p1, 0]), int(hand.landmarks[p1, 1])
+        x2, y2 = int(hand.landmarks[p2, 0]), int(hand.landmarks[p2, 1])
 
         cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
 
@@ -114,5 +336,4 @@ class HandDetector:
             # The center point
             cv2.circle(img, (cx, cy), r, (0, 0, 255), cv2.FILLED)
 
-        length = math.hypot(x2 - x1, y2 - y1)
-        return length, img, [x1, y1, x2, y2, cx, cy]
+        return hand.distance(p1, p2), img, [x1, y1, x2, y2, cx, cy]
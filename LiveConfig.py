@@ -0,0 +1,132 @@
+import copy
+import json
+import os
+import threading
+
+import numpy as np
+
+from GestureTable import compile_gestures, compile_pinches
+from GestureState import gesture_timing
+from CursorFilters import create_filter, create_predictor
+
+# Settings sections that are built into long-lived objects (detectors, captures, the mouse
+# backend) and only take effect after the controller is recreated
+RESTART_SETTINGS = ("inference", "cameras", "governor", "output")
+
+# "scroll" settings: speed in lines per second while a scroll gesture is held.
+# "displacement": speed, plus gain per pixel the hand moved up/down since the gesture started
+# (beyond dead_zone), in the gesture's direction; "velocity": gain per px/s of hand motion
+SCROLL_DEFAULTS = {
+    "mode": "displacement",
+    "speed": 10.0,
+    "gain": 0.25,
+    "dead_zone": 10,
+    "max_speed": 60.0,
+    "rate_hz": 60,
+}
+SCROLL_MODES = ("displacement", "velocity")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ConfigSnapshot:
+    # Validated and precompiled config, swapped into the controller as a whole between frames.
+    # Building it raises ValueError on invalid gestures or settings, the controller keeps the
+    # old one then. The cursor filter and predictor are built here too, so nothing can fail
+    # half way through the swap
+    __slots__ = ("config", "right_action_names", "right_actions", "pinches", "left_apps", "conflicts",
+                 "adapter_for_cam", "gesture_timing", "cursor_filter", "cursor_prediction",
+                 "filter", "predictor", "cursor_rate", "show_timings", "scroll")
+
+    def __init__(self, config, bind=None):
+        self.config = copy.deepcopy(config) # The GUI keeps editing its own dict
+        settings = self.config["settings"]
+
+        right_hand, left_hand, conflicts = compile_gestures(self.config)
+        self.right_action_names = right_hand
+        self.right_actions = {action: bind(action) for action in set(right_hand.values())} if bind else {}
+        self.left_apps = left_hand
+
+        # (action, finger_a, finger_b, threshold, wanted states of all five fingers)
+        self.pinches = [(action, finger_a, finger_b, threshold, np.array(fingers_up, np.uint8))
+                        for action, finger_a, finger_b, threshold, fingers_up in compile_pinches(self.config)]
+        self.right_actions.update({action: bind(action) for action, *_ in self.pinches} if bind else {})
+        self.conflicts = conflicts
+
+        self.adapter_for_cam = settings["adapter_for_cam"] # Vertical shift of the capture area, pixels
+        if not _is_number(self.adapter_for_cam):
+            raise ValueError(f"adapter_for_cam must be a number, got {self.adapter_for_cam!r}")
+        self.gesture_timing = gesture_timing(settings) # Seconds
+        # smoothening only sets the default ema filter, it's compared with the filter config
+        self.cursor_filter = (settings.get("cursor_filter"), settings.get("smoothening"))
+        self.cursor_prediction = settings.get("cursor_prediction")
+        self.filter = create_filter(settings)
+        self.predictor = create_predictor(settings)
+        self.cursor_rate = settings.get("cursor_output", {}).get("rate_hz", 0) # Glide steps per second, 0 - off
+        if not _is_number(self.cursor_rate) or self.cursor_rate < 0:
+            raise ValueError(f"cursor_output.rate_hz must be a non-negative number, got {self.cursor_rate!r}")
+        self.show_timings = settings.get("timings", {}).get("overlay", False)
+        preview_fps = settings.get("preview_fps", 30)
+        if not _is_number(preview_fps) or not 0 < preview_fps <= 1000:
+            raise ValueError(f"preview_fps must be a number in (0, 1000], got {preview_fps!r}")
+
+        self.scroll = dict(SCROLL_DEFAULTS, **settings.get("scroll", {}))
+        if self.scroll["mode"] not in SCROLL_MODES:
+            raise ValueError(f"Unknown scroll mode {self.scroll['mode']!r}, expected one of {SCROLL_MODES}")
+        for key in SCROLL_DEFAULTS:
+            if key != "mode" and (not _is_number(self.scroll[key]) or self.scroll[key] < 0):
+                raise ValueError(f"scroll.{key} must be a non-negative number, got {self.scroll[key]!r}")
+        if self.scroll["rate_hz"] <= 0:
+            raise ValueError("scroll.rate_hz must be positive")
+
+    # Changed settings sections that the swap can't apply
+    def restart_settings(self, other):
+        return [key for key in RESTART_SETTINGS
+                if self.config["settings"].get(key) != other.config["settings"].get(key)]
+
+
+class ConfigWatcher:
+    # Polls the config file's mtime and size and hands every valid new version to publish(config).
+    # A stat per interval costs nothing next to a frame and needs no inotify dependency
+    def __init__(self, path, publish, interval=1.0):
+        self.path = path
+        self.publish = publish
+        self.interval = interval
+
+        self._stamp = self._stat()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stamp = self._stat()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                self.publish(config)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Half-written file or invalid gestures: keep the running config
+                print(f"Конфиг не применён: {e}")
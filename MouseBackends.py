@@ -0,0 +1,278 @@
+import time
+
+# Mouse output backends for the Actuator. Every backend takes button names ("left"/"right"),
+# has position (settable), click, press, release, scroll, flush, close, screen_size,
+# smooth_scroll (takes fractional scroll amounts) and reports its per-event cost.
+# Backends that batch send nothing until flush(), the actuator flushes once its queue is drained
+BACKENDS = ("pynput", "xtest", "uinput", "recording")
+
+
+class _Backend:
+    smooth_scroll = False
+
+    def __init__(self):
+        self.costs = {} # event -> [count, seconds]
+
+    def _count(self, event, start):
+        cost = self.costs.setdefault(event, [0, 0.0])
+        cost[0] += 1
+        cost[1] += time.perf_counter() - start
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        start = time.perf_counter()
+        self._move(position)
+        self._position = position
+        self._count("move", start)
+
+    def click(self, button, count=1):
+        start = time.perf_counter()
+        for _ in range(count):
+            self._button(button, True)
+            self._button(button, False)
+        self._count("click", start)
+
+    def press(self, button):
+        start = time.perf_counter()
+        self._button(button, True)
+        self._count("press", start)
+
+    def release(self, button):
+        start = time.perf_counter()
+        self._button(button, False)
+        self._count("release", start)
+
+    def scroll(self, dx, dy):
+        start = time.perf_counter()
+        self._scroll(dx, dy)
+        self._count("scroll", start)
+
+    def flush(self):
+        start = time.perf_counter()
+        self._flush()
+        self._count("flush", start)
+
+    def _flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {event: {"count": count, "mean_us": seconds / count * 1e6}
+                for event, (count, seconds) in self.costs.items() if count}
+
+    def report(self):
+        costs = ", ".join(f"{event} {cost['mean_us']:.1f} us x{cost['count']}" for event, cost in self.stats().items())
+        return f"[{type(self).__name__}] {costs or 'no events'}"
+
+
+class PynputBackend(_Backend):
+    # pynput Controller, every call is sent at once. The screen size comes from X
+    def __init__(self, screen_size=None):
+        super().__init__()
+        from pynput.mouse import Button, Controller
+
+        self.controller = Controller()
+        self.buttons = {"left": Button.left, "right": Button.right}
+        self._position = self.controller.position
+        if screen_size is None:
+            from Xlib import display
+            screen = display.Display().screen()
+            screen_size = screen.width_in_pixels, screen.height_in_pixels
+        self.screen_size = tuple(screen_size)
+
+    def _move(self, position):
+        self.controller.position = position
+
+    def _button(self, button, down):
+        if down:
+            self.controller.press(self.buttons[button])
+        else:
+            self.controller.release(self.buttons[button])
+
+    def _scroll(self, dx, dy):
+        self.controller.scroll(dx, dy)
+
+
+class XTestBackend(_Backend):
+    # XTest fake input on one persistent X connection. Events are buffered by Xlib
+    # and go to the server together on flush(), one write per actuator batch
+    BUTTONS = {"left": 1, "right": 3}
+
+    def __init__(self, screen_size=None):
+        super().__init__()
+        from Xlib import X, display
+        from Xlib.ext import xtest
+
+        self._X = X
+        self._xtest = xtest
+        self.display = display.Display()
+        if not self.display.has_extension("XTEST"):
+            self.display.close()
+            raise RuntimeError("X server has no XTEST extension")
+
+        screen = self.display.screen()
+        self.screen_size = tuple(screen_size or (screen.width_in_pixels, screen.height_in_pixels))
+        pointer = screen.root.query_pointer()
+        self._position = (pointer.root_x, pointer.root_y)
+
+    def _move(self, position):
+        x, y = position
+        self._xtest.fake_input(self.display, self._X.MotionNotify, x=int(round(x)), y=int(round(y)))
+
+    def _button(self, button, down):
+        self._xtest.fake_input(self.display, self._X.ButtonPress if down else self._X.ButtonRelease,
+                               self.BUTTONS[button])
+
+    # Wheel buttons: 4/5 - up/down, 6/7 - left/right, one press per line
+    def _scroll(self, dx, dy):
+        for amount, positive, negative in ((int(dy), 4, 5), (int(dx), 7, 6)):
+            for _ in range(abs(amount)):
+                self._button_code(positive if amount > 0 else negative)
+
+    def _button_code(self, code):
+        self._xtest.fake_input(self.display, self._X.ButtonPress, code)
+        self._xtest.fake_input(self.display, self._X.ButtonRelease, code)
+
+    def _flush(self):
+        self.display.flush()
+
+    def close(self):
+        self.display.close()
+
+
+class UinputBackend(_Backend):
+    # Virtual absolute pointer through /dev/uinput (python-evdev), works on Wayland where
+    # X fake input doesn't reach other clients. Needs write access to /dev/uinput.
+    # There is no portable way to ask the compositor for the screen size, so it comes
+    # from the config ("output.screen_size") or X if it's there.
+    # The event frame is closed with a SYN on flush()
+    smooth_scroll = True # High-resolution wheel, 120 units per line
+
+    def __init__(self, screen_size=None):
+        super().__init__()
+        from evdev import AbsInfo, UInput, ecodes
+
+        if screen_size is None:
+            try:
+                from Xlib import display
+                screen = display.Display().screen()
+                screen_size = screen.width_in_pixels, screen.height_in_pixels
+            except Exception:
+                raise RuntimeError("uinput backend needs output.screen_size in the config")
+        self.screen_size = tuple(screen_size)
+
+        self._e = ecodes
+        self.buttons = {"left": ecodes.BTN_LEFT, "right": ecodes.BTN_RIGHT}
+        width, height = self.screen_size
+        self.device = UInput({
+            ecodes.EV_KEY: list(self.buttons.values()),
+            ecodes.EV_ABS: [(ecodes.ABS_X, AbsInfo(0, 0, width - 1, 0, 0, 0)),
+                            (ecodes.ABS_Y, AbsInfo(0, 0, height - 1, 0, 0, 0))],
+            ecodes.EV_REL: [ecodes.REL_WHEEL, ecodes.REL_HWHEEL,
+                            ecodes.REL_WHEEL_HI_RES, ecodes.REL_HWHEEL_HI_RES],
+        }, name="HandCTRL pointer")
+        self._position = (width // 2, height // 2)
+        self._pending = False # Events written since the last SYN
+        self._wheel = [0.0, 0.0] # Hi-res remainders, (x, y)
+        self._lines = [0.0, 0.0] # Line remainders
+
+    def _write(self, event_type, code, value):
+        self.device.write(event_type, code, value)
+        self._pending = True
+
+    def _move(self, position):
+        x, y = position
+        width, height = self.screen_size
+        self._write(self._e.EV_ABS, self._e.ABS_X, min(max(int(round(x)), 0), width - 1))
+        self._write(self._e.EV_ABS, self._e.ABS_Y, min(max(int(round(y)), 0), height - 1))
+
+    # A press and its release must be in separate frames or they are dropped
+    def _button(self, button, down):
+        self._write(self._e.EV_KEY, self.buttons[button], 1 if down else 0)
+        self._flush()
+
+    def _scroll(self, dx, dy):
+        for axis, amount, hi_res, lines in ((0, dx, self._e.REL_HWHEEL_HI_RES, self._e.REL_HWHEEL),
+                                            (1, dy, self._e.REL_WHEEL_HI_RES, self._e.REL_WHEEL)):
+            self._wheel[axis] += amount * 120
+            units = int(self._wheel[axis])
+            if units:
+                self._wheel[axis] -= units
+                self._write(self._e.EV_REL, hi_res, units)
+
+            # Clients without hi-res support get whole lines
+            self._lines[axis] += amount
+            whole = int(self._lines[axis])
+            if whole:
+                self._lines[axis] -= whole
+                self._write(self._e.EV_REL, lines, whole)
+
+    def _flush(self):
+        if self._pending:
+            self.device.syn()
+            self._pending = False
+
+    def close(self):
+        self.device.close()
+
+
+class RecordingBackend(_Backend):
+    # Keeps every event in memory instead of moving a cursor: tests, benchmarks, replays
+    smooth_scroll = True
+
+    def __init__(self, screen_size=(1920, 1080), keep_events=True):
+        super().__init__()
+        self.screen_size = tuple(screen_size)
+        self._position = (0, 0)
+        self.keep_events = keep_events
+        self.log = [] # (perf_counter time, event, args)
+        self.events = {"move": 0, "click": 0, "press": 0, "release": 0, "scroll": 0}
+        self.scrolled = 0.0 # Lines, summed
+        self.flushes = 0
+
+    def _record(self, event, args):
+        self.events[event] += 1
+        if self.keep_events:
+            self.log.append((time.perf_counter(), event, args))
+
+    def _move(self, position):
+        self._record("move", tuple(position))
+
+    def click(self, button, count=1):
+        start = time.perf_counter()
+        self._record("click", (button, count))
+        self._count("click", start)
+
+    def _button(self, button, down):
+        self._record("press" if down else "release", (button,))
+
+    def _scroll(self, dx, dy):
+        self._record("scroll", (dx, dy))
+        self.scrolled += dy
+
+    def _flush(self):
+        self.flushes += 1
+
+
+# Backend from config["settings"]["output"]: {"backend": one of BACKENDS, "screen_size": [w, h]}.
+# Without the section it's pynput, as before the backends existed
+def create_backend(output=None, screen_size=None):
+    output = output or {}
+    backend = output.get("backend", "pynput")
+    screen_size = screen_size or output.get("screen_size")
+
+    if backend == "pynput":
+        return PynputBackend(screen_size)
+    if backend == "xtest":
+        return XTestBackend(screen_size)
+    if backend == "uinput":
+        return UinputBackend(screen_size)
+    if backend == "recording":
+        return RecordingBackend(screen_size or (1920, 1080))
+    raise ValueError(f"Unknown output backend {backend!r}, expected one of {BACKENDS}")
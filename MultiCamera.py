@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+
+FUSION_MODES = ("select", "average")
+
+
+# Camera source from the config: device index or a video file / stream URL.
+# Without a size the camera keeps its default resolution
+def open_camera(source, w_cam=None, h_cam=None):
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if w_cam and h_cam:
+        cap.set(3, w_cam)
+        cap.set(4, h_cam)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Don't let the driver queue stale frames
+    return cap
+
+
+def open_cameras(sources, w_cam, h_cam):
+    caps = [open_camera(source, w_cam, h_cam) for source in sources]
+    missing = [source for source, cap in zip(sources, caps) if not cap.isOpened()]
+    if missing:
+        print(f"Не удалось открыть камеры: {missing}")
+    return caps
+
+
+def _empty():
+    return np.empty((0, 21, 3), np.float32), [], np.empty(0, np.float32)
+
+
+class HandFusion:
+    # Merges per-camera (landmarks, labels, scores) into one hand per label, in pixels of the
+    # primary camera. Cameras look from different angles, so a secondary camera's landmarks are
+    # mapped with a similarity transform (rotation, scale, shift) fitted from hands both cameras
+    # see and smoothed over frames. Until a camera has one, its hands are used only when no
+    # mapped camera sees that hand.
+    # "select" keeps the chosen camera until another one beats it by switch_margin in score
+    # and it has been held min_hold seconds. "average" weights mapped landmarks by score
+    def __init__(self, mode="select", switch_margin=0.1, min_hold=0.5, fit_rate=0.1):
+        if mode not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode {mode!r}, expected one of {FUSION_MODES}")
+        self.mode = mode
+        self.switch_margin = switch_margin
+        self.min_hold = min_hold
+        self.fit_rate = fit_rate # Weight of a new fit in the smoothed transform
+        self.transforms = {} # Camera -> 2x3 matrix into the primary camera's pixels
+        self._selected = {} # Label -> (camera, selected since)
+
+    def reset(self):
+        self._selected = {}
+
+    # results: per camera in camera order, None for a camera without a fresh result
+    def __call__(self, results, t):
+        self._fit(results)
+
+        candidates = {} # Label -> [(camera, landmarks, score, mapped)]
+        for camera, result in enumerate(results):
+            if result is None:
+                continue
+            for hand_landmarks, label, score in zip(*result):
+                mapped = self._map(camera, hand_landmarks)
+                candidates.setdefault(label, []).append(
+                    (camera, hand_landmarks if mapped is None else mapped, float(score), mapped is not None))
+
+        self._selected = {label: selected for label, selected in self._selected.items() if label in candidates}
+        if not candidates:
+            return _empty()
+
+        fused_landmarks, fused_labels, fused_scores = [], [], []
+        for label, hands in candidates.items():
+            hands = [hand for hand in hands if hand[3]] or [max(hands, key=lambda hand: hand[2])]
+            weights = np.array([score for _, _, score, _ in hands], np.float32)
+            if self.mode == "average" and len(hands) > 1 and weights.sum() > 0:
+                stacked = np.stack([hand_landmarks for _, hand_landmarks, _, _ in hands])
+                fused_landmarks.append(np.tensordot(weights / weights.sum(), stacked, axes=1))
+                fused_scores.append(weights.max())
+            else:
+                camera, hand_landmarks, score, _ = self._select(label, hands, t)
+                fused_landmarks.append(hand_landmarks)
+                fused_scores.append(score)
+            fused_labels.append(label)
+
+        return (np.array(fused_landmarks, np.float32), fused_labels, np.array(fused_scores, np.float32))
+
+    def _select(self, label, hands, t):
+        best = max(hands, key=lambda hand: hand[2])
+        current = self._selected.get(label)
+        if current is not None:
+            camera, since = current
+            held = next((hand for hand in hands if hand[0] == camera), None)
+            if held is not None and (t - since < self.min_hold or best[2] < held[2] + self.switch_margin):
+                return held
+        self._selected[label] = (best[0], t)
+        return best
+
+    # Landmarks of a camera in the primary camera's pixels, None without a transform yet
+    def _map(self, camera, hand_landmarks):
+        if camera == 0:
+            return hand_landmarks
+        transform = self.transforms.get(camera)
+        if transform is None:
+            return None
+        mapped = np.empty_like(hand_landmarks)
+        mapped[:, :2] = hand_landmarks[:, :2] @ transform[:, :2].T + transform[:, 2]
+        mapped[:, 2] = hand_landmarks[:, 2] * np.sqrt(abs(np.linalg.det(transform[:, :2]))) # z scales like x
+        return mapped
+
+    # Refit the transforms of cameras that see a hand the primary camera sees too
+    def _fit(self, results):
+        if not results or results[0] is None:
+            return
+        primary = dict(zip(results[0][1], results[0][0]))
+        for camera, result in enumerate(results[1:], 1):
+            if result is None:
+                continue
+            for hand_landmarks, label in zip(result[0], result[1]):
+                if label not in primary:
+                    continue
+                transform, _ = cv2.estimateAffinePartial2D(np.ascontiguousarray(hand_landmarks[:, :2]),
+                                                           np.ascontiguousarray(primary[label][:, :2]))
+                if transform is None:
+                    continue
+                previous = self.transforms.get(camera)
+                self.transforms[camera] = transform if previous is None else \
+                    previous + (transform - previous) * self.fit_rate
+                break
@@ -0,0 +1,312 @@
+import gc
+import threading
+import time
+
+import cv2
+
+from FramePool import FramePool
+
+
+class LatestSlot:
+    # Single-item handoff between stages: a new item replaces an unread one,
+    # so a slow consumer always gets the freshest frame instead of a backlog
+    def __init__(self, name, on_drop=None):
+        self.name = name
+        self.dropped = 0
+        self.on_drop = on_drop # Called with a replaced item (returns its buffer to the pool)
+
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            replaced = self._item if self._has_item else None
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+
+        if replaced is not None and self.on_drop:
+            self.on_drop(replaced)
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._has_item and not self._closed:
+                self._cond.wait(timeout)
+
+            if not self._has_item:
+                return None
+
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FramePacket:
+    # Work item travelling through the pipeline
+    __slots__ = ("index", "timestamp", "img", "hands")
+
+    def __init__(self, index, timestamp, img):
+        self.index = index
+        self.timestamp = timestamp # Capture time (time.monotonic)
+        self.img = img
+        self.hands = None
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy_time = 0.0
+        self.start_time = time.monotonic()
+
+    def add(self, duration):
+        self.count += 1
+        self.busy_time += duration
+
+    def fps(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def avg_ms(self):
+        return self.busy_time / self.count * 1000 if self.count else 0.0
+
+
+class Pipeline:
+    STAGES = ("capture", "detect", "gesture", "display")
+
+    # caps: one capture or a list of them, the first is the primary camera (shown and used for gestures).
+    # Every camera has its own capture and detect threads; the other cameras' latest hands
+    # are fused into the primary camera's frames
+    def __init__(self, caps, hand_control, poll_timeout=0.1, pool_size=8):
+        self.caps = list(caps) if isinstance(caps, (list, tuple)) else [caps]
+        self.cap = self.caps[0]
+        self.hand_control = hand_control
+        self.poll_timeout = poll_timeout
+
+        if len(self.caps) > len(hand_control.detectors):
+            raise ValueError(f"{len(self.caps)} cameras but only {len(hand_control.detectors)} hand detectors")
+
+        # Frame buffers: one per stage and slot plus a spare, for every camera
+        self.pool = FramePool((hand_control.h_cam, hand_control.w_cam, 3), pool_size * len(self.caps))
+
+        # Handoffs between stages
+        self.detect_slots = [LatestSlot(f"capture{i}->detect" if i else "capture->detect", self.release)
+                             for i in range(len(self.caps))]
+        self.detect_slot = self.detect_slots[0]
+        self.gesture_slot = LatestSlot("detect->gesture", self.release)
+        self.display_slot = LatestSlot("gesture->display", self.release)
+        self.slots = (*self.detect_slots, self.gesture_slot, self.display_slot)
+
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+        for i in range(1, len(self.caps)):
+            self.stats[f"capture{i}"] = StageStats(f"capture{i}")
+            self.stats[f"detect{i}"] = StageStats(f"detect{i}")
+
+        # Latest (timestamp, hands) of the secondary cameras
+        self._camera_hands = [None] * len(self.caps)
+
+        self._running = threading.Event()
+        self._threads = []
+        self._cpu_start = time.process_time()
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        # Long-lived objects (model, buffers) are moved out of the GC's way while tracking,
+        # instead of forcing full collections. stop() gives them back
+        gc.collect()
+        gc.freeze()
+
+        self._running.set()
+        for stats in self.stats.values():
+            stats.start_time = time.monotonic()
+        self._cpu_start = time.process_time()
+
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._stage_loop, name="detect", daemon=True,
+                             args=("detect", self.detect_slot, self.gesture_slot, self._detect)),
+            threading.Thread(target=self._stage_loop, name="gesture", daemon=True,
+                             args=("gesture", self.gesture_slot, self.display_slot, self._gesture)),
+        ]
+        for i in range(1, len(self.caps)):
+            self._threads += [
+                threading.Thread(target=self._capture_loop, name=f"capture{i}", daemon=True, args=(i,)),
+                threading.Thread(target=self._camera_loop, name=f"detect{i}", daemon=True, args=(i,)),
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running.clear()
+        for slot in self.slots:
+            slot.close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+        # The slots call back into this pipeline: break the cycle so it and its pool can go
+        for slot in self.slots:
+            slot.on_drop = None
+        gc.unfreeze()
+
+    def _capture_loop(self, camera=0):
+        name = f"capture{camera}" if camera else "capture"
+        stats = self.stats[name]
+        cap = self.caps[camera]
+        out_slot = self.detect_slots[camera]
+        governor = self.hand_control.governor
+        fps = None
+        last_capture = 0.0
+        index = 0 # Frame number of this camera
+
+        while self._running.is_set():
+            # Governor: ask the camera for the mode's rate and throttle reads while idle
+            if governor.enabled and governor.fps != fps:
+                fps = governor.fps
+                cap.set(cv2.CAP_PROP_FPS, fps)
+            wait = last_capture + governor.frame_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            last_capture = time.monotonic()
+
+            start = time.perf_counter()
+            buf = self.pool.acquire()
+            success, img = cap.read(buf)
+            self.hand_control.timings.add(name, time.perf_counter() - start)
+            if not success:
+                print(f"Не удалось получить кадр с камеры {camera}")
+                self.pool.release(buf)
+                if camera == 0: # Without the primary camera there is nothing to show
+                    self._running.clear()
+                break
+
+            if img is not buf: # Driver returned its own array
+                self.pool.release(buf)
+
+            packet = FramePacket(index, time.monotonic(), img)
+            index += 1
+            stats.add(time.perf_counter() - start)
+
+            out_slot.put(packet)
+
+        out_slot.close()
+
+    def _stage_loop(self, name, in_slot, out_slot, func):
+        stats = self.stats[name]
+
+        while self._running.is_set():
+            packet = in_slot.get(self.poll_timeout)
+            if packet is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                packet = func(packet)
+            except Exception as e:
+                print(f"Ошибка стадии {name}: {e}")
+                self.release(packet)
+                continue
+            stats.add(time.perf_counter() - start)
+
+            out_slot.put(packet)
+
+        out_slot.close()
+
+    # Secondary camera: detection only, its frames are not shown
+    def _camera_loop(self, camera):
+        stats = self.stats[f"detect{camera}"]
+        detector = self.hand_control.detectors[camera]
+
+        while self._running.is_set():
+            packet = self.detect_slots[camera].get(self.poll_timeout)
+            if packet is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                self._camera_hands[camera] = (packet.timestamp,
+                                              self.hand_control._detect_camera(packet.img, detector))
+            except Exception as e:
+                print(f"Ошибка стадии detect{camera}: {e}")
+            self.release(packet)
+            stats.add(time.perf_counter() - start)
+
+    def _detect(self, packet):
+        if len(self.caps) == 1:
+            packet.hands = self.hand_control._detect(packet.img)
+            return packet
+
+        results = [self.hand_control._detect_camera(packet.img, self.hand_control.hand_detector,
+                                                    self.hand_control.draw)]
+        max_age = self.hand_control.fusion_max_age
+        for camera_hands in self._camera_hands[1:]:
+            fresh = camera_hands is not None and abs(packet.timestamp - camera_hands[0]) <= max_age
+            results.append(camera_hands[1] if fresh else None) # Keeps camera indexes for the fusion
+        packet.hands = self.hand_control._fuse(results)
+        return packet
+
+    def _gesture(self, packet):
+        packet.img = self.hand_control._handle_hands(packet.img, packet.hands, packet.timestamp)
+        return packet
+
+    # Display runs in the caller's thread (cv2.imshow / Tk want their own thread).
+    # show(packet) returns False to stop the pipeline, show=None is headless:
+    # frames are only returned to the pool
+    def run_display(self, show, report_interval=None):
+        stats = self.stats["display"]
+        last_report = time.monotonic()
+
+        while self._running.is_set():
+            packet = self.display_slot.get(self.poll_timeout)
+            if packet is not None and show is None:
+                self.release(packet)
+            elif packet is not None:
+                start = time.perf_counter()
+                keep_running = show(packet)
+                stats.add(time.perf_counter() - start)
+                self.hand_control.timings.add("display", time.perf_counter() - start)
+                self.release(packet)
+
+                if keep_running is False:
+                    break
+
+            if report_interval and time.monotonic() - last_report >= report_interval:
+                print(self.report())
+                last_report = time.monotonic()
+
+        self.stop()
+
+    # Return a finished or dropped frame's buffer to the pool
+    def release(self, packet):
+        self.pool.release(packet.img)
+        packet.img = None
+
+    # Process CPU time (all threads) per frame that went through the gesture stage
+    def cpu_per_frame_ms(self):
+        frames = self.stats["gesture"].count
+        return (time.process_time() - self._cpu_start) / frames * 1000 if frames else 0.0
+
+    def dropped_frames(self):
+        return sum(slot.dropped for slot in self.slots)
+
+    def report(self):
+        stages = ", ".join(
+            f"{stats.name}: {stats.fps():.1f} fps / {stats.avg_ms():.1f} ms"
+            for stats in self.stats.values()
+        )
+        drops = ", ".join(f"{slot.name}: {slot.dropped}" for slot in self.slots)
+        return (f"[pipeline] {stages} | dropped {self.dropped_frames()} ({drops}) | "
+                f"pool misses {self.pool.misses} | cpu {self.cpu_per_frame_ms():.1f} ms/frame")
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+# File: MAGIC, u32 header length, JSON header (config, camera and screen size),
+# padding to HEADER_ALIGN, then fixed-size RECORD entries appended one per frame.
+# A config swap during recording starts the next segment file: session.hclog,
+# session.1.hclog, ... Each one replays with the config its frames were handled with
+MAGIC = b"HCTRLOG1"
+HEADER_ALIGN = 64
+MAX_HANDS = 2
+
+LABELS = ("", "left", "right")
+
+RECORD = np.dtype([
+    ("t", "<f8"), # Frame timestamp, seconds
+    ("n_hands", "u1"),
+    ("labels", "u1", (MAX_HANDS,)), # Index in LABELS
+    ("scores", "<f4", (MAX_HANDS,)),
+    ("landmarks", "<f4", (MAX_HANDS, 21, 3)), # Pixels, as from HandDetector.find_landmarks
+    ("fingers", "u1", (MAX_HANDS, 5)),
+    ("actions", "S32", (MAX_HANDS,)), # Action per hand, "" if none
+])
+
+
+class SessionRecorder:
+    # Binary log of hand tracking results. An existing file is overwritten: its frames
+    # belong to another session's header
+    def __init__(self, path, config, w_cam, h_cam, screen_size, flush_every=30):
+        self.path = path
+        self.flush_every = flush_every
+        self.records = 0
+        self.segment = 0
+        self.segment_path = path
+        self._header = {"w_cam": w_cam, "h_cam": h_cam, "screen_size": list(screen_size)}
+        self._open(path, config)
+
+        self._record = np.zeros(1, RECORD)
+        self._empty = np.zeros((), RECORD)
+
+    def _open(self, path, config):
+        self._file = open(path, 'wb')
+        self._write_header(dict(self._header, config=config, segment=self.segment, created=time.time()))
+
+    # Frames handled with a new config go to the next segment file
+    def new_segment(self, config):
+        self.close()
+        self.segment += 1
+        base, ext = os.path.splitext(self.path)
+        self.segment_path = f"{base}.{self.segment}{ext}"
+        self._open(self.segment_path, config)
+        print(f"Настройки изменены, запись продолжается в {self.segment_path}")
+
+    def _write_header(self, header):
+        data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        size = len(MAGIC) + 4 + len(data)
+        padding = -size % HEADER_ALIGN
+        self._file.write(MAGIC + struct.pack("<I", len(data) + padding) + data + b" " * padding)
+
+    def write(self, timestamp, landmarks, labels, scores, fingers, actions):
+        self._record[0] = self._empty
+        record = self._record[0]
+
+        n = min(len(labels), MAX_HANDS)
+        record["t"] = timestamp
+        record["n_hands"] = n
+        record["labels"][:n] = [LABELS.index(label) if label in LABELS else 0 for label in labels[:n]]
+        record["scores"][:n] = scores[:n]
+        record["landmarks"][:n] = landmarks[:n]
+        record["fingers"][:n] = fingers[:n]
+        record["actions"][:n] = [action.encode('utf-8')[:32] for action in actions[:n]]
+
+        self._file.write(self._record.tobytes())
+        self.records += 1
+        if self.records % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+    return header, len(MAGIC) + 4 + length
+
+
+class SessionLog:
+    # Memory-mapped view of a recorded session
+    def __init__(self, path):
+        self.path = path
+        self.header, offset = read_header(path)
+
+        count = (os.path.getsize(path) - offset) // RECORD.itemsize # A partly written last record is ignored
+        self.records = np.memmap(path, dtype=RECORD, mode='r', offset=offset, shape=(count,)) if count \
+            else np.zeros(0, RECORD)
+
+    def __len__(self):
+        return len(self.records)
+
+    # (timestamp, (landmarks, labels, scores)) in the format of HandControl._detect
+    def frames(self):
+        for record in self.records:
+            n = int(record["n_hands"])
+            labels = [LABELS[label] for label in record["labels"][:n]]
+            yield float(record["t"]), (np.array(record["landmarks"][:n]), labels, np.array(record["scores"][:n]))
+
+    def actions(self):
+        return [[action.decode('utf-8') for action in record["actions"][:record["n_hands"]]]
+                for record in self.records]
+
+
+# Feed a session into a HandControl without Mediapipe, as fast as possible.
+# Returns the actions taken per frame
+def replay(log, hand_control):
+    img = np.zeros((hand_control.h_cam, hand_control.w_cam, 3), np.uint8)
+
+    actions = []
+    for timestamp, hands_data in log.frames():
+        hand_control._handle_hands(img, hands_data, timestamp)
+        actions.append(list(hand_control.last_actions))
+    return actions
+
+
+def main():
+    from HandMouse import HandControl
+    from Benchmark import StubLauncher
+    from MouseBackends import RecordingBackend
+
+    parser = argparse.ArgumentParser(description="Replay a recorded HandControl session")
+    parser.add_argument("log")
+    parser.add_argument("--config", help="replay with this config instead of the recorded one")
+    args = parser.parse_args()
+
+    log = SessionLog(args.log)
+    header = log.header
+    config = header["config"]
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+
+    hand_control = HandControl(header["w_cam"], header["h_cam"], screen_size=tuple(header["screen_size"]),
+                               mouse=RecordingBackend(header["screen_size"], keep_events=False), config=config)
+    hand_control._launch_application = StubLauncher()
+
+    start = time.perf_counter()
+    actions = replay(log, hand_control)
+    elapsed = time.perf_counter() - start
+    hand_control.close()
+
+    recorded = log.actions()
+    mismatches = [i for i, (a, b) in enumerate(zip(actions, recorded)) if a != b]
+    duration = float(log.records["t"][-1] - log.records["t"][0]) if len(log) else 0.0
+
+    print(f"{len(log)} frames ({duration:.1f} s recorded) replayed in {elapsed:.2f} s")
+    print(f"Apps launched: {hand_control._launch_application.launched}")
+    print(f"Frames with different actions: {len(mismatches)}")
+    for i in mismatches[:20]:
+        print(f"  frame {i} t={log.records['t'][i]:.3f}: recorded {recorded[i]}, replayed {actions[i]}")
+
+
+if __name__ == "__main__":
+    main()
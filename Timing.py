@@ -0,0 +1,119 @@
+import json
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Histogram bucket edges, ms
+HISTOGRAM_BINS_MS = (0, 0.5, 1, 2, 4, 8, 16, 33, 66, 133, float("inf"))
+
+
+class Timings:
+    # Named timing spans shared by all stages. Keeps the last `window` samples
+    # of every span (all samples if window is None)
+    def __init__(self, window=300):
+        self.window = window
+        self.spans = {}
+
+    def _samples(self, name):
+        samples = self.spans.get(name)
+        if samples is None:
+            samples = self.spans.setdefault(name, deque(maxlen=self.window))
+        return samples
+
+    def add(self, name, duration):
+        self._samples(name).append(duration)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._samples(name).append(time.perf_counter() - start)
+
+    def summary(self):
+        result = {}
+        for name, samples in list(self.spans.items()):
+            if not samples:
+                continue
+            ms = np.array(list(samples)) * 1000
+            result[name] = {
+                "count": int(ms.size),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+            }
+        return result
+
+    def histograms(self):
+        return {
+            name: np.histogram(np.array(list(samples)) * 1000, bins=HISTOGRAM_BINS_MS)[0].tolist()
+            for name, samples in list(self.spans.items()) if samples
+        }
+
+    # Span table in the top right corner of a BGR frame
+    def draw(self, img, x=None, y=20):
+        summary = self.summary()
+        x = img.shape[1] - 250 if x is None else x
+        for name, metrics in summary.items():
+            cv2.putText(img, f"{name:<14} {metrics['p50_ms']:5.1f} / {metrics['p95_ms']:5.1f}", (x, y),
+                        cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 255), 1)
+            y += 16
+        return img
+
+
+class TimingExporter:
+    # Writes rolling summaries and histograms once per interval as JSON lines,
+    # to a file or to "udp://host:port"
+    def __init__(self, timings, target, interval=1.0):
+        self.timings = timings
+        self.target = target
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+        self._address = None
+
+        if target.startswith("udp://"):
+            host, port = target[len("udp://"):].rsplit(":", 1)
+            self._address = (host, int(port))
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="timing-export", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        if self._socket:
+            self._socket.close()
+
+    def snapshot(self):
+        return {
+            "time": time.time(),
+            "bins_ms": list(HISTOGRAM_BINS_MS[:-1]),
+            "spans": self.timings.summary(),
+            "histograms": self.timings.histograms(),
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            line = json.dumps(self.snapshot())
+            try:
+                if self._socket:
+                    self._socket.sendto(line.encode('utf-8'), self._address)
+                else:
+                    with open(self.target, 'a') as f:
+                        f.write(line + "\n")
+            except OSError as e:
+                print(f"Ошибка экспорта таймингов: {e}")